@@ -1,6 +1,7 @@
 # ruff: noqa: ERA001, E501
 """Base settings to build other settings files upon."""
 
+import os
 import ssl
 from pathlib import Path
 
@@ -303,6 +304,12 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-soft-time-limit
 # TODO: set to whatever value is adequate in your circumstances
 CELERY_TASK_SOFT_TIME_LIMIT = 60
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-prefetch-multiplier
+# PDF extraction tasks are long running, so each worker process reserves one task at a time
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-max-memory-per-child
+# Recycle a worker process once its resident memory exceeds this many KiB after a task
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = env.int("CELERY_WORKER_MAX_MEMORY_PER_CHILD", default=512 * 1024)
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
@@ -358,6 +365,56 @@ SPECTACULAR_SETTINGS = {
 # Your stuff...
 # ------------------------------------------------------------------------------
 
+# PDF EXTRACTION
+# ------------------------------------------------------------------------------
+# Bump when a change to the text extraction settings should invalidate cached text
+PDF_TEXT_EXTRACTION_VERSION = 2
+# Size limit of the in-process extracted text LRU cache
+PDF_TEXT_CACHE_MAX_BYTES = env.int("PDF_TEXT_CACHE_MAX_BYTES", default=64 * 1024 * 1024)
+# Cache alias of the shared extracted text tier (Redis in production). Point this at a
+# FileBasedCache alias for a local disk store, or set it empty to disable the shared tier.
+PDF_TEXT_CACHE_ALIAS = env("PDF_TEXT_CACHE_ALIAS", default="default")
+PDF_TEXT_CACHE_TIMEOUT = env.int("PDF_TEXT_CACHE_TIMEOUT", default=7 * 24 * 60 * 60)
+# Documents with at least this many pages are parsed page-parallel in a process pool
+PDF_PARALLEL_PAGE_THRESHOLD = env.int("PDF_PARALLEL_PAGE_THRESHOLD", default=50)
+PDF_PARALLEL_MAX_WORKERS = env.int("PDF_PARALLEL_MAX_WORKERS", default=min(4, os.cpu_count() or 1))
+# Largest number of PDF files accepted by one batch extraction request
+PDF_BATCH_MAX_FILES = env.int("PDF_BATCH_MAX_FILES", default=500)
+# Django rejects multipart requests with more files than this
+DATA_UPLOAD_MAX_NUMBER_FILES = PDF_BATCH_MAX_FILES
+# Lifetime of a cached job status document, a state transition replaces it earlier
+PDF_JOB_STATUS_CACHE_TIMEOUT = env.int("PDF_JOB_STATUS_CACHE_TIMEOUT", default=24 * 60 * 60)
+# Redis used to push extraction progress from the workers to WebSocket subscribers,
+# empty to disable progress events
+PDF_PROGRESS_REDIS_URL = env("PDF_PROGRESS_REDIS_URL", default=REDIS_URL)
+# Events buffered per WebSocket subscriber before the oldest are dropped
+PDF_PROGRESS_QUEUE_SIZE = env.int("PDF_PROGRESS_QUEUE_SIZE", default=100)
+# Async extract-text endpoint: uploads parsed at once per ASGI process, uploads that
+# may wait for a free parser, and seconds clients are told to wait when both are taken
+PDF_ASYNC_EXTRACT_MAX_CONCURRENCY = env.int("PDF_ASYNC_EXTRACT_MAX_CONCURRENCY", default=PDF_PARALLEL_MAX_WORKERS)
+PDF_ASYNC_EXTRACT_MAX_QUEUED = env.int("PDF_ASYNC_EXTRACT_MAX_QUEUED", default=PDF_PARALLEL_MAX_WORKERS)
+PDF_ASYNC_EXTRACT_RETRY_AFTER = env.int("PDF_ASYNC_EXTRACT_RETRY_AFTER", default=5)
+# Celery time limits in seconds of the extraction of one PDF item, large scanned PDFs
+# take much longer than the global task limits allow
+PDF_PROCESS_ITEM_SOFT_TIME_LIMIT = env.int("PDF_PROCESS_ITEM_SOFT_TIME_LIMIT", default=10 * 60)
+PDF_PROCESS_ITEM_TIME_LIMIT = env.int("PDF_PROCESS_ITEM_TIME_LIMIT", default=PDF_PROCESS_ITEM_SOFT_TIME_LIMIT + 60)
+# Celery time limits in seconds of one backfill chunk, a first backfill parses every PDF
+PDF_BACKFILL_CHUNK_SOFT_TIME_LIMIT = env.int("PDF_BACKFILL_CHUNK_SOFT_TIME_LIMIT", default=15 * 60)
+PDF_BACKFILL_CHUNK_TIME_LIMIT = env.int("PDF_BACKFILL_CHUNK_TIME_LIMIT", default=PDF_BACKFILL_CHUNK_SOFT_TIME_LIMIT + 60)
+# Items whose results are written with a single bulk UPDATE when one task rewrites many,
+# as a backfill chunk does; a live extraction writes its single item at once
+PDF_RESULT_WRITE_BATCH_SIZE = env.int("PDF_RESULT_WRITE_BATCH_SIZE", default=100)
+# Wall-clock budget in seconds for evaluating a single regex rule, 0 disables it
+REGEX_RULE_TIME_BUDGET = env.float("REGEX_RULE_TIME_BUDGET", default=2.0)
+# Item pattern hit statistics: seconds between refreshes of the shared counters, and
+# number of recorded attempts after which a process flushes its own counters
+REGEX_PATTERN_STATS_REFRESH = env.float("REGEX_PATTERN_STATS_REFRESH", default=60.0)
+REGEX_PATTERN_STATS_FLUSH_THRESHOLD = env.int("REGEX_PATTERN_STATS_FLUSH_THRESHOLD", default=100)
+# Largest number of stored documents a rule dry run may evaluate
+REGEX_DRY_RUN_MAX_SAMPLE = env.int("REGEX_DRY_RUN_MAX_SAMPLE", default=1000)
+# Wall-clock limit in seconds of a rule dry run, its worker processes are killed after it
+REGEX_DRY_RUN_TIMEOUT = env.int("REGEX_DRY_RUN_TIMEOUT", default=60)
+
 # UNFOLD DJANGO ADMIN CONFIGURATION
 # ------------------------------------------------------------------------------
 UNFOLD = {
@@ -1,13 +1,169 @@
+import asyncio
+import json
+import logging
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http.request import split_domain_port
+from django.http.request import validate_host
+from django.utils.http import is_same_domain
+
+logger = logging.getLogger(__name__)
+
+
+def origin_allowed(origin):
+    """Whether a browser ``Origin`` is one of ALLOWED_HOSTS or CSRF_TRUSTED_ORIGINS, as CSRF checks it"""
+    if origin in settings.CSRF_TRUSTED_ORIGINS:
+        return True
+    parsed = urlsplit(origin)
+    for trusted in settings.CSRF_TRUSTED_ORIGINS:
+        trusted = urlsplit(trusted)
+        if "*" not in trusted.netloc or trusted.scheme != parsed.scheme:
+            continue
+        if is_same_domain(parsed.netloc, trusted.netloc.lstrip("*")):
+            return True
+    domain, _ = split_domain_port(parsed.netloc)
+    return bool(domain) and validate_host(domain, settings.ALLOWED_HOSTS)
+
+
+@sync_to_async
+def authenticate(scope):
+    """
+    Return the user of a DRF token passed as ``?token=`` or of the session cookie, or None.
+
+    Browsers send the session cookie with cross-site handshakes too, so the session is only
+    used when the handshake's Origin is allowed. Clients without one pass a token.
+    """
+    from django.contrib.auth import get_user
+    from django.utils.module_loading import import_string
+    from rest_framework.authtoken.models import Token
+
+    token_key = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+    if token_key:
+        token = Token.objects.select_related("user").filter(key=token_key).first()
+        return token.user if token and token.user.is_active else None
+
+    cookies = SimpleCookie()
+    origin = None
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+        elif name == b"origin":
+            origin = value.decode("latin-1")
+    if origin is None or not origin_allowed(origin):
+        return None
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if session_key is None:
+        return None
+    session_store = import_string(f"{settings.SESSION_ENGINE}.SessionStore")
+    user = get_user(SimpleNamespace(session=session_store(session_key.value)))
+    return user if user.is_authenticated else None
+
+
+@sync_to_async
+def can_view_job(user, job_id):
+    from pdf_extraction.jobs import can_view_job
+
+    return can_view_job(user, job_id)
+
+
+@sync_to_async
+def job_status(job_id):
+    from pdf_extraction.jobs import get_job_status
+
+    return get_job_status(job_id)
+
+
 async def websocket_application(scope, receive, send):
-    while True:
-        event = await receive()
+    """
+    Extraction progress channel.
+
+    After connecting with a token or session, a client sends
+    ``{"action": "subscribe", "job_id": <id>}`` and receives the job's current status,
+    then every item and page progress event published by the workers, until it sends
+    ``{"action": "unsubscribe", "job_id": <id>}`` or disconnects. "ping" answers "pong!".
+    """
+    from pdf_extraction.progress import encode_event
+    from pdf_extraction.progress import get_progress_hub
+
+    hub = get_progress_hub()
+    user = None
+    # job id -> (event queue, task forwarding the queue to this connection)
+    subscriptions = {}
+
+    async def send_event(event):
+        await send({"type": "websocket.send", "text": encode_event(event)})
+
+    async def forward(queue):
+        while True:
+            await send({"type": "websocket.send", "text": await queue.get()})
+
+    async def subscribe(job_id):
+        if job_id in subscriptions:
+            return
+        if not settings.PDF_PROGRESS_REDIS_URL:
+            await send_event({"type": "error", "job_id": job_id, "error": "Progress events are disabled"})
+            return
+        # Jobs are only visible to the users the REST status endpoint shows them to
+        if not await can_view_job(user, job_id):
+            await send_event({"type": "error", "job_id": job_id, "error": "Extraction job not found"})
+            return
+        # Subscribe before reading the status, so no transition falls between the two
+        queue = await hub.subscribe(job_id)
+        current = await job_status(job_id)
+        if current is None:
+            await hub.unsubscribe(job_id, queue)
+            await send_event({"type": "error", "job_id": job_id, "error": "Extraction job not found"})
+            return
+        await send_event({"type": "status", "job_id": job_id, "status": current[1]})
+        subscriptions[job_id] = (queue, asyncio.create_task(forward(queue)))
+
+    async def unsubscribe(job_id):
+        if job_id not in subscriptions:
+            return
+        queue, task = subscriptions.pop(job_id)
+        task.cancel()
+        await hub.unsubscribe(job_id, queue)
+
+    try:
+        while True:
+            event = await receive()
+
+            if event["type"] == "websocket.connect":
+                user = await authenticate(scope)
+                if user is None:
+                    await send({"type": "websocket.close", "code": 4401})
+                    break
+                await send({"type": "websocket.accept"})
+
+            if event["type"] == "websocket.disconnect":
+                break
 
-        if event["type"] == "websocket.connect":
-            await send({"type": "websocket.accept"})
+            if event["type"] == "websocket.receive":
+                text = event.get("text") or ""
+                if text == "ping":
+                    await send({"type": "websocket.send", "text": "pong!"})
+                    continue
 
-        if event["type"] == "websocket.disconnect":
-            break
+                try:
+                    message = json.loads(text)
+                    action, job_id = message["action"], int(message["job_id"])
+                except (ValueError, KeyError, TypeError):
+                    await send_event({"type": "error", "error": "Expected an action and a job_id"})
+                    continue
 
-        if event["type"] == "websocket.receive":
-            if event["text"] == "ping":
-                await send({"type": "websocket.send", "text": "pong!"})
+                if action == "subscribe":
+                    try:
+                        await subscribe(job_id)
+                    except Exception as e:
+                        logger.error(f"Could not subscribe to progress of extraction {job_id}: {str(e)}")
+                        await send_event({"type": "error", "job_id": job_id, "error": "Progress events are unavailable"})
+                elif action == "unsubscribe":
+                    await unsubscribe(job_id)
+    finally:
+        for job_id in list(subscriptions):
+            await unsubscribe(job_id)
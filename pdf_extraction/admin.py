@@ -1,13 +1,15 @@
 from django.contrib import admin
+from django.contrib import messages
 from unfold.admin import ModelAdmin, TabularInline
-from .models import PDFExtraction, PDFExtractionItem
+from .models import ExtractedFieldValue, PDFExtraction, PDFExtractionItem
+from .services import PDFExtractionService
 
 
 class PDFExtractionItemInline(TabularInline):
     model = PDFExtractionItem
     extra = 1
-    fields = ('pdf_file', 'pdf_file_name', 'result_data')
-    readonly_fields = ('created_at', 'updated_at', 'pdf_file_name', 'result_data')
+    fields = ('pdf_file', 'pdf_file_name', 'status', 'finished_at', 'error_message', 'result_data')
+    readonly_fields = ('created_at', 'updated_at', 'pdf_file_name', 'status', 'finished_at', 'error_message', 'result_data')
     exclude = ('created_by', 'updated_by')
 
 
@@ -18,6 +20,7 @@ class PDFExtractionAdmin(ModelAdmin):
     search_fields = ('customer_name', 'customer_id')
     readonly_fields = ('created_at', 'updated_at', 'total_token', 'input_token', 'output_token')
     exclude = ('created_by', 'updated_by')
+    actions = ['reprocess_all_items']
 
     fieldsets = (
         ('Customer Information', {
@@ -70,3 +73,34 @@ class PDFExtractionAdmin(ModelAdmin):
             obj.delete()
 
         formset.save_m2m()
+
+    def reprocess_all_items(self, request, queryset):
+        """
+        Action for re-running extraction on every item, even when the PDF is unchanged
+        """
+        service = PDFExtractionService()
+        queued_count = 0
+
+        for extraction in queryset:
+            queued_count += service.reprocess_extraction(extraction.id)
+
+        self.message_user(
+            request,
+            f'{queued_count} PDF items queued for re-processing.',
+            messages.SUCCESS
+        )
+
+    reprocess_all_items.short_description = "Reprocess all PDF items"
+
+
+@admin.register(ExtractedFieldValue)
+class ExtractedFieldValueAdmin(ModelAdmin):
+    list_display = ('customer_name', 'field_name', 'row_index', 'value_text', 'value_number', 'value_date', 'pdf_item')
+    list_filter = ('customer_name', 'field_name', 'value_date')
+    search_fields = ('field_name', 'value_text')
+    list_select_related = ('pdf_item',)
+    readonly_fields = ('pdf_item', 'customer_name', 'field_name', 'row_index', 'value_text', 'value_number', 'value_date')
+
+    def has_add_permission(self, request):
+        # Rows are written by the extraction pipeline together with result_data
+        return False
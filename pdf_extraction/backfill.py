@@ -0,0 +1,144 @@
+import logging
+import time
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Optional
+
+from celery.exceptions import SoftTimeLimitExceeded
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.utils.text import slugify
+
+from regex_engine.rules import get_rule_set
+
+from .models import PDFExtractionItem
+from .results import ResultWriter
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = 'pdf_extraction:backfill:{run_id}'
+
+# Items per chunk; items without a stored text artifact have their PDF parsed
+DEFAULT_CHUNK_SIZE = 100
+
+
+def backfill_queryset(
+    customer_name: Optional[str] = None, since: Optional[date] = None, until: Optional[date] = None,
+    after_id: int = 0
+) -> QuerySet:
+    """Regex-extracted items to re-extract, in id order so a run can resume after its last id"""
+    queryset = PDFExtractionItem.objects.filter(pdf_extraction__extraction_method='regex', id__gt=after_id)
+    if customer_name:
+        queryset = queryset.filter(pdf_extraction__customer_name=customer_name)
+    if since:
+        queryset = queryset.filter(created_at__date__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__date__lte=until)
+    return queryset.order_by('id')
+
+
+def iter_id_chunks(queryset: QuerySet, chunk_size: int) -> Iterator[List[int]]:
+    """Stream item ids with a server-side cursor, grouped in lists of ``chunk_size``"""
+    chunk = []
+    for item_id in queryset.values_list('id', flat=True).iterator(chunk_size=chunk_size):
+        chunk.append(item_id)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def make_run_id(customer_name: Optional[str], since: Optional[date], until: Optional[date]) -> str:
+    return f"{slugify(customer_name or 'all')}:{since or ''}:{until or ''}"
+
+
+def get_checkpoint(run_id: str) -> int:
+    """Last item id handled by a backfill run, 0 when it has not started"""
+    return cache.get(CHECKPOINT_KEY.format(run_id=run_id), 0)
+
+
+def set_checkpoint(run_id: str, item_id: int) -> None:
+    cache.set(CHECKPOINT_KEY.format(run_id=run_id), item_id, timeout=None)
+
+
+def clear_checkpoint(run_id: str) -> None:
+    cache.delete(CHECKPOINT_KEY.format(run_id=run_id))
+
+
+def reextract_items(item_ids: List[int]) -> Dict[str, int]:
+    """
+    Recompute result_data of the given items with the current rules and write it back with one bulk_update.
+
+    Text comes from the stored artifacts where possible. bulk_update runs neither save() nor
+    post_save, so the items are not re-queued and full_clean is skipped. Items that fail are
+    logged and left unchanged. Results are written every PDF_RESULT_WRITE_BATCH_SIZE items,
+    so a chunk stopped by its soft time limit keeps the results computed up to then.
+    """
+    from .services import PDFExtractionService
+
+    service = PDFExtractionService()
+    items = list(PDFExtractionItem.objects.select_related('pdf_extraction').filter(id__in=item_ids).order_by('id'))
+    failed = 0
+
+    with ResultWriter(fields=('result_data', 'updated_at')) as writer:
+        for item in items:
+            try:
+                customer_name = item.pdf_extraction.customer_name
+                text = service.get_item_text(
+                    item, content_hash=item.content_hash or None, rule_set=get_rule_set(customer_name)
+                )
+                writer.add(item, service.extract_data_using_regex(text, customer_name))
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:
+                failed += 1
+                logger.error(f"Backfill failed for PDF item {item.id}: {str(e)}")
+
+    return {'updated': writer.written, 'failed': failed}
+
+
+def run_backfill(
+    customer_name: Optional[str] = None, since: Optional[date] = None, until: Optional[date] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE, resume: bool = False, dispatch: bool = False,
+    progress: Optional[Callable[[Dict[str, float]], None]] = None
+) -> Dict[str, float]:
+    """
+    Re-extract historical items chunk by chunk, recording a checkpoint after each chunk.
+
+    With ``dispatch`` every chunk is sent to the Celery workers instead of being processed
+    here; the checkpoint then marks the last dispatched item, and acks_late keeps dispatched
+    chunks on the broker until a worker has finished them. ``progress`` is called after each
+    chunk with the running totals.
+    """
+    from .tasks import reextract_items_chunk
+
+    run_id = make_run_id(customer_name, since, until)
+    after_id = get_checkpoint(run_id) if resume else 0
+    if after_id:
+        logger.info(f"Resuming backfill {run_id} after PDF item {after_id}")
+
+    totals = {'chunks': 0, 'items': 0, 'updated': 0, 'failed': 0, 'seconds': 0.0, 'items_per_second': 0.0}
+    started = time.perf_counter()
+
+    for chunk in iter_id_chunks(backfill_queryset(customer_name, since, until, after_id), chunk_size):
+        if dispatch:
+            reextract_items_chunk.delay(chunk)
+        else:
+            result = reextract_items(chunk)
+            totals['updated'] += result['updated']
+            totals['failed'] += result['failed']
+        set_checkpoint(run_id, chunk[-1])
+
+        totals['chunks'] += 1
+        totals['items'] += len(chunk)
+        totals['seconds'] = time.perf_counter() - started
+        totals['items_per_second'] = totals['items'] / totals['seconds'] if totals['seconds'] else 0.0
+        if progress:
+            progress(dict(totals, last_id=chunk[-1]))
+
+    clear_checkpoint(run_id)
+    logger.info(
+        f"Backfill {run_id} finished: {totals['items']} items in {totals['seconds']:.1f}s "
+        f"({totals['items_per_second']:.1f} items/sec)"
+    )
+    return totals
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file on disk, hashed through a read-only memory map"""
+    with open(file_path, 'rb') as f:
+        # Empty files cannot be mapped
+        if not os.fstat(f.fileno()).st_size:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+class ExtractedTextCache:
+    """
+    Two-tier cache of extracted PDF documents, keyed by the SHA-256 of the PDF bytes.
+
+    Cached documents are dicts holding the joined ``text`` and the ``page_offsets``
+    of every page within it.
+
+    The first tier is an in-process LRU bounded by the total size of the cached text.
+    The second tier is a Django cache alias shared by all processes (Redis in
+    production, or a FileBasedCache alias for a local disk store).
+    """
+
+    def __init__(self, max_bytes: int, cache_alias: Optional[str], timeout: Optional[int], version: int):
+        self.max_bytes = max_bytes
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.version = version
+
+        self._entries: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @classmethod
+    def from_settings(cls) -> 'ExtractedTextCache':
+        return cls(
+            max_bytes=settings.PDF_TEXT_CACHE_MAX_BYTES,
+            cache_alias=settings.PDF_TEXT_CACHE_ALIAS,
+            timeout=settings.PDF_TEXT_CACHE_TIMEOUT,
+            version=settings.PDF_TEXT_EXTRACTION_VERSION,
+        )
+
+    def make_key(self, content_hash: str) -> str:
+        return f'pdf_text:v{self.version}:{content_hash}'
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the cached document for the PDF fingerprint, or None on a miss"""
+        key = self.make_key(content_hash)
+
+        with self._lock:
+            document = self._entries.get(key)
+            if document is not None:
+                self._entries.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return document
+
+        document = self._shared_cache.get(key) if self.cache_alias else None
+        if document is not None:
+            self._remember(key, document)
+            with self._lock:
+                self._counters['shared_hits'] += 1
+            return document
+
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def set(self, content_hash: str, document: Dict[str, Any]) -> None:
+        """Store an extracted document in both tiers"""
+        key = self.make_key(content_hash)
+        self._remember(key, document)
+        if self.cache_alias:
+            self._shared_cache.set(key, document, timeout=self.timeout)
+
+    def clear(self) -> None:
+        """Drop the in-process tier and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._current_bytes = 0
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of this process, plus the current size of the in-process tier"""
+        with self._lock:
+            lookups = sum(self._counters[name] for name in ('memory_hits', 'shared_hits', 'misses'))
+            return {
+                **self._counters,
+                'lookups': lookups,
+                'entries': len(self._entries),
+                'size_bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    @property
+    def _shared_cache(self):
+        return caches[self.cache_alias]
+
+    def _remember(self, key: str, document: Dict[str, Any]) -> None:
+        size = len(document['text'].encode('utf-8'))
+        if size > self.max_bytes:
+            logger.debug(f"Extracted text of {size} bytes exceeds the in-process cache size, not keeping it in memory")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._current_bytes -= self._sizes[key]
+            self._entries[key] = document
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._current_bytes -= self._sizes.pop(evicted_key)
+                self._counters['evictions'] += 1
+
+
+_text_cache: Optional[ExtractedTextCache] = None
+_text_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> ExtractedTextCache:
+    """Return the process-wide extracted text cache"""
+    global _text_cache
+    if _text_cache is None:
+        with _text_cache_lock:
+            if _text_cache is None:
+                _text_cache = ExtractedTextCache.from_settings()
+    return _text_cache
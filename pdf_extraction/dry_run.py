@@ -0,0 +1,144 @@
+import logging
+import math
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .executor import run_in_processes
+from .models import PDFExtractionItem
+
+logger = logging.getLogger(__name__)
+
+# Fields of CustomerRegexRule that make up a candidate rule
+RULE_FIELDS = (
+    'id', 'field_name', 'regex_pattern', 'regex_pattern_v2', 'regex_pattern_v3', 'regex_group',
+    'is_item_field', 'is_row_anchor', 'is_untrusted',
+)
+
+# Documents per worker process, below this starting another worker costs more than it saves
+PARALLEL_MIN_DOCUMENTS = 50
+
+Document = Tuple[int, str, bytes, Optional[Dict[str, Any]]]
+
+
+class DryRunTimeout(Exception):
+    """Raised when a dry run does not finish within REGEX_DRY_RUN_TIMEOUT"""
+
+
+def diff_results(current: Optional[Dict[str, Any]], candidate: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Header fields and item cells whose candidate value differs from the current result_data"""
+    current = current or {}
+    fields = []
+    for field_name in sorted((set(current) | set(candidate)) - {'items', 'timed_out_rules'}):
+        if current.get(field_name) != candidate.get(field_name):
+            fields.append({'field': field_name, 'current': current.get(field_name), 'candidate': candidate.get(field_name)})
+
+    items = []
+    current_items = current.get('items') or []
+    candidate_items = candidate.get('items') or []
+    for row in range(max(len(current_items), len(candidate_items))):
+        current_row = current_items[row] if row < len(current_items) else {}
+        candidate_row = candidate_items[row] if row < len(candidate_items) else {}
+        for field_name in sorted(set(current_row) | set(candidate_row)):
+            if current_row.get(field_name) != candidate_row.get(field_name):
+                items.append({
+                    'row': row, 'field': field_name,
+                    'current': current_row.get(field_name), 'candidate': candidate_row.get(field_name),
+                })
+    return {'fields': fields, 'items': items}
+
+
+def _evaluate_documents(customer_name: str, rules: List[Dict[str, Any]], documents: List[Document]) -> List[Dict[str, Any]]:
+    """Run the candidate rules over a slice of documents, compiling them once for the slice"""
+    from regex_engine.models import CustomerRegexRule
+    from regex_engine.rules import CompiledRuleSet
+    from .services import PDFExtractionService
+
+    rule_set = CompiledRuleSet(customer_name, [CustomerRegexRule(customer_name=customer_name, **rule) for rule in rules])
+    service = PDFExtractionService()
+    results = []
+    for item_id, file_name, compressed_text, current in documents:
+        text = zlib.decompress(compressed_text).decode('utf-8').strip()
+        candidate = service.extract_data_using_regex(text, customer_name, rule_set=rule_set)
+        diff = diff_results(current, candidate)
+        results.append({
+            'item_id': item_id,
+            'pdf_file_name': file_name,
+            'changed': bool(diff['fields'] or diff['items']),
+            'fields': diff['fields'],
+            'items': diff['items'],
+            'timed_out_rules': candidate.get('timed_out_rules', []),
+        })
+    return results
+
+
+def load_sample(customer_name: str, sample_size: int) -> List[Document]:
+    """The latest items of a customer that have stored text, newest first"""
+    rows = (
+        PDFExtractionItem.objects
+        .filter(pdf_extraction__customer_name=customer_name, text_artifact__isnull=False)
+        .order_by('-id')
+        .values_list('id', 'pdf_file_name', 'text_artifact__compressed_text', 'result_data')[:sample_size]
+    )
+    return [(item_id, file_name, bytes(text), result) for item_id, file_name, text, result in rows]
+
+
+def dry_run_rules(
+    customer_name: str, rules: List[Dict[str, Any]], sample_size: int = 100, max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Evaluate a candidate rule set against the latest stored documents of a customer.
+
+    ``rules`` are dicts of CustomerRegexRule fields (see RULE_FIELDS). Text comes from the
+    stored artifacts, no PDF is parsed, and nothing is written: the result lists, per
+    document, the header fields and item cells whose value would change.
+
+    Candidate patterns are untrusted, so they never run in the calling process: they run
+    in new worker processes, where the per-rule time budget applies, and the workers are
+    killed when the run exceeds REGEX_DRY_RUN_TIMEOUT, raising DryRunTimeout.
+    """
+    started = time.perf_counter()
+    rules = [
+        dict({key: value for key, value in rule.items() if key in RULE_FIELDS}, id=rule.get('id') or -index)
+        for index, rule in enumerate(rules, start=1)
+    ]
+    documents = load_sample(customer_name, sample_size)
+
+    if max_workers is None:
+        max_workers = settings.PDF_PARALLEL_MAX_WORKERS
+    workers = max(1, min(max_workers, math.ceil(len(documents) / PARALLEL_MIN_DOCUMENTS)))
+    slice_size = max(1, math.ceil(len(documents) / workers))
+    slices = [documents[start:start + slice_size] for start in range(0, len(documents), slice_size)]
+    logger.info(f"Dry-running {len(rules)} rules on {len(documents)} documents with {len(slices)} worker processes")
+    try:
+        slice_results = run_in_processes(
+            'pdf_extraction.dry_run._evaluate_documents',
+            [(customer_name, rules, chunk) for chunk in slices],
+            timeout=max(started + settings.REGEX_DRY_RUN_TIMEOUT - time.perf_counter(), 0),
+        )
+    except TimeoutError as e:
+        raise DryRunTimeout(f"Dry run did not finish within {settings.REGEX_DRY_RUN_TIMEOUT} seconds") from e
+    results = [result for slice_result in slice_results for result in slice_result]
+
+    changed_fields: Dict[str, int] = {}
+    for result in results:
+        for field_name in {change['field'] for change in result['fields'] + result['items']}:
+            changed_fields[field_name] = changed_fields.get(field_name, 0) + 1
+
+    return {
+        'customer_name': customer_name,
+        'documents': len(results),
+        'changed': sum(1 for result in results if result['changed']),
+        'changed_fields': changed_fields,
+        'seconds': round(time.perf_counter() - started, 3),
+        'results': results,
+    }
+
+
+def rules_as_dicts(customer_name: str) -> List[Dict[str, Any]]:
+    """The stored rules of a customer, in the form dry_run_rules takes"""
+    from regex_engine.models import CustomerRegexRule
+
+    return list(CustomerRegexRule.objects.filter(customer_name=customer_name).order_by('id').values(*RULE_FIELDS))
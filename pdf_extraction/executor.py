@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, List, Optional, Sequence
+
+import billiard
+from billiard.pool import Pool
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a bounded executor has no free slot for more work"""
+
+
+class BoundedExecutor:
+    """
+    Thread pool for the blocking part of async views, with a hard limit on admitted work.
+
+    At most ``max_workers`` calls run at once and ``max_queued`` more wait for a thread;
+    beyond that ``submit`` raises ExecutorSaturated straight away, so callers can shed
+    load instead of piling up requests. A slot is released when the call finishes, or
+    when it is cancelled while still waiting for a thread.
+    """
+
+    def __init__(self, max_workers: int, max_queued: int = 0):
+        self.max_workers = max_workers
+        self.slots = max_workers + max_queued
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-extract')
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> asyncio.Future:
+        """Run ``fn(*args)`` in the pool, returning an awaitable of its result"""
+        with self._lock:
+            if self.in_flight >= self.slots:
+                raise ExecutorSaturated(f"All {self.slots} extraction slots are in use")
+            self.in_flight += 1
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Also called when a queued call is cancelled, for example when its client disconnects
+        future.add_done_callback(lambda _: self._release())
+        return asyncio.wrap_future(future)
+
+    async def iterate(self, iterable: Iterable[Any]) -> AsyncIterator[Any]:
+        """
+        Iterate over a blocking iterable on the pool's threads, one item per call, as the
+        content of a streamed response is produced. This takes no slot, the request holding
+        the iterable was admitted already, but the work still shares the pool's threads.
+        """
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            future = self._executor.submit(next, iterator, done)
+            try:
+                item = await asyncio.wrap_future(future)
+            finally:
+                # A cancelled caller must not close the iterator while a call of it still runs
+                if not future.done():
+                    await asyncio.wrap_future(future)
+            if item is done:
+                return
+            yield item
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+@contextmanager
+def process_pool(processes: int) -> Iterator[Pool]:
+    """
+    Pool of worker processes for CPU-bound work, such as parsing the pages of a large PDF.
+
+    Extractions run in Celery prefork children, which are daemonic processes, and
+    multiprocessing (so ProcessPoolExecutor) refuses to start children from those.
+    billiard, the multiprocessing fork Celery runs on, has no such restriction, so the
+    pool works in a worker as well as in a web or management process. The pool is
+    terminated when the block is left early, by an error or by closing a generator.
+    """
+    pool = billiard.Pool(processes)
+    try:
+        yield pool
+    except BaseException:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
+
+
+def _call_in_worker(connection, function_path: str, args: tuple) -> None:
+    """Entry point of the processes of run_in_processes, sending back the result or the error"""
+    from django.apps import apps
+
+    if not apps.ready:
+        import django
+
+        django.setup()
+    try:
+        connection.send((True, import_string(function_path)(*args)))
+    except Exception as e:
+        connection.send((False, f"{type(e).__name__}: {str(e)}"))
+    finally:
+        connection.close()
+
+
+def run_in_processes(function_path: str, calls: Sequence[tuple], timeout: float) -> List[Any]:
+    """
+    Return ``function(*args)`` for each args of ``calls``, every call running in a new process.
+
+    The processes are spawned rather than forked, which is safe from a threaded web server,
+    and the function runs on their main thread, where signal-based time budgets work. It is
+    given by dotted path, as it can only be imported once Django is set up in the new
+    process. Calls still running after ``timeout`` seconds are killed and TimeoutError is raised.
+    """
+    context = billiard.get_context('spawn')
+    deadline = time.monotonic() + timeout
+    workers = []
+    try:
+        for args in calls:
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_call_in_worker, args=(sender, function_path, args), daemon=True)
+            process.start()
+            sender.close()
+            workers.append((process, receiver))
+
+        results = []
+        for process, receiver in workers:
+            if not receiver.poll(max(deadline - time.monotonic(), 0)):
+                raise TimeoutError(f"{function_path} did not finish within {timeout} seconds")
+            succeeded, value = receiver.recv()
+            if not succeeded:
+                raise RuntimeError(f"{function_path} failed in its worker process: {value}")
+            results.append(value)
+        return results
+    finally:
+        for process, receiver in workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            receiver.close()
+
+
+_executor: Optional[BoundedExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_extraction_executor() -> BoundedExecutor:
+    """Return the executor of this process running uploads of the async extract-text endpoint"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BoundedExecutor(
+                    settings.PDF_ASYNC_EXTRACT_MAX_CONCURRENCY, settings.PDF_ASYNC_EXTRACT_MAX_QUEUED
+                )
+    return _executor
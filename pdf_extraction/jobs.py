@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import PDFExtraction, PDFExtractionItem
+
+logger = logging.getLogger(__name__)
+
+JOB_GENERATION_KEY = 'pdf_extraction:job:{extraction_id}:generation'
+JOB_STATUS_KEY = 'pdf_extraction:job:{extraction_id}:status:{generation}'
+JOB_OWNER_KEY = 'pdf_extraction:job:{extraction_id}:owner'
+
+TERMINAL_STATUSES = (PDFExtractionItem.STATUS_DONE, PDFExtractionItem.STATUS_FAILED)
+
+
+def get_job_generation(extraction_id: int) -> str:
+    """
+    Return the state generation of an extraction job, initialising it when the cache holds none.
+
+    Only call it for jobs that exist. The generation expires with the status documents
+    built for it, so deleted jobs do not stay in the cache.
+    """
+    key = JOB_GENERATION_KEY.format(extraction_id=extraction_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, timeout=settings.PDF_JOB_STATUS_CACHE_TIMEOUT)
+        generation = cache.get(key)
+    return generation
+
+
+def can_view_job(user, extraction_id: int) -> bool:
+    """
+    Whether a user may see an extraction job and its results: staff see every job, other
+    users the jobs they created. False as well when the job does not exist.
+
+    The creator of a job never changes, so it is cached and polling stays free of queries.
+    """
+    if user.is_staff:
+        return True
+    key = JOB_OWNER_KEY.format(extraction_id=extraction_id)
+    owner = cache.get(key)
+    if owner is None:
+        owner = PDFExtraction.objects.filter(id=extraction_id).values_list('created_by', flat=True).first()
+        if not owner:
+            return False
+        cache.set(key, owner, timeout=settings.PDF_JOB_STATUS_CACHE_TIMEOUT)
+    return owner == user.get_username()
+
+
+def touch_jobs(extraction_ids: Iterable[int]) -> None:
+    """
+    Record a state transition of the given extraction jobs once the current transaction commits.
+
+    Cached status documents are keyed by generation, so a document built from the state
+    before the transition is never served after it, even if it is stored late.
+    """
+    extraction_ids = set(extraction_ids)
+
+    def bump():
+        for extraction_id in extraction_ids:
+            cache.set(
+                JOB_GENERATION_KEY.format(extraction_id=extraction_id), uuid.uuid4().hex,
+                timeout=settings.PDF_JOB_STATUS_CACHE_TIMEOUT
+            )
+
+    transaction.on_commit(bump)
+
+
+def _seconds_between(start, end) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return round((end - start).total_seconds(), 3)
+
+
+def build_status_document(extraction: PDFExtraction) -> Dict[str, Any]:
+    """Per-item state, progress counts and timings of an extraction job"""
+    items = list(
+        extraction.pdf_items.order_by('id').values(
+            'id', 'pdf_file_name', 'status', 'queued_at', 'started_at', 'finished_at', 'error_message', 'peak_rss_bytes'
+        )
+    )
+    counts = {status: 0 for status, _ in PDFExtractionItem.STATUS_CHOICES}
+    for item in items:
+        counts[item['status']] = counts.get(item['status'], 0) + 1
+        item['queue_seconds'] = _seconds_between(item['queued_at'], item['started_at'])
+        item['processing_seconds'] = _seconds_between(item['started_at'], item['finished_at'])
+
+    started = [item['started_at'] for item in items if item['started_at']]
+    finished = [item['finished_at'] for item in items if item['finished_at']]
+    complete = bool(items) and all(item['status'] in TERMINAL_STATUSES for item in items)
+    # Results can be rewritten without a state transition, as by a backfill
+    results_updated_at = extraction.pdf_items.aggregate(updated_at=Max('updated_at'))['updated_at']
+
+    return {
+        'job_id': extraction.id,
+        'customer_name': extraction.customer_name,
+        'created_at': extraction.created_at,
+        'complete': complete,
+        'total': len(items),
+        'counts': counts,
+        'progress': round(sum(counts[status] for status in TERMINAL_STATUSES) / len(items), 4) if items else 0.0,
+        'started_at': min(started) if started else None,
+        'finished_at': max(finished) if complete and finished else None,
+        'elapsed_seconds': _seconds_between(min(started), max(finished)) if complete and started and finished else None,
+        'results_updated_at': results_updated_at,
+        'items': items,
+    }
+
+
+def make_etag(document: Dict[str, Any]) -> str:
+    payload = json.dumps(document, sort_keys=True, default=str).encode('utf-8')
+    return f'"{hashlib.sha256(payload).hexdigest()[:32]}"'
+
+
+def get_job_status(extraction_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Return ``(etag, status_document)`` of an extraction job, or None when it does not exist.
+
+    The document is cached until the job's next state transition, so polling costs a
+    cache read as long as nothing changes.
+    """
+    generation = cache.get(JOB_GENERATION_KEY.format(extraction_id=extraction_id))
+    if generation is not None:
+        cached = cache.get(JOB_STATUS_KEY.format(extraction_id=extraction_id, generation=generation))
+        if cached is not None:
+            return cached
+
+    extraction = PDFExtraction.objects.filter(id=extraction_id).first()
+    if extraction is None:
+        # Nothing is cached for ids that do not exist, callers cannot fill the cache with them
+        return None
+
+    # Read before building, so a transition during the build is not hidden by this document
+    generation = generation or get_job_generation(extraction_id)
+    key = JOB_STATUS_KEY.format(extraction_id=extraction_id, generation=generation)
+    document = build_status_document(extraction)
+    cached = (make_etag(document), document)
+    cache.set(key, cached, timeout=settings.PDF_JOB_STATUS_CACHE_TIMEOUT)
+    return cached
+
+
+def build_results_document(extraction_id: int) -> Dict[str, Any]:
+    """The result_data of every item of an extraction job, in item order"""
+    items = PDFExtractionItem.objects.filter(pdf_extraction_id=extraction_id).order_by('id')
+    results = [
+        {'item_id': item_id, 'pdf_file_name': file_name, 'status': status, 'result_data': result_data}
+        for item_id, file_name, status, result_data in items.values_list('id', 'pdf_file_name', 'status', 'result_data')
+    ]
+    return {'job_id': extraction_id, 'results': results}
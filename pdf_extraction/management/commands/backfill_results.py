@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils.dateparse import parse_date
+
+from pdf_extraction.backfill import DEFAULT_CHUNK_SIZE
+from pdf_extraction.backfill import make_run_id
+from pdf_extraction.backfill import run_backfill
+
+
+class Command(BaseCommand):
+    help = "Recompute result_data of stored PDF items with the current regex rules"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer', help="Only re-extract items of this customer")
+        parser.add_argument('--since', help="Only items created on or after this date (YYYY-MM-DD)")
+        parser.add_argument('--until', help="Only items created on or before this date (YYYY-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Items per chunk")
+        parser.add_argument('--resume', action='store_true', help="Continue after the last chunk of an interrupted run")
+        parser.add_argument('--dispatch', action='store_true', help="Send chunks to the Celery workers instead of processing them here")
+
+    def handle(self, *args, **options):
+        since = self.parse_date_option(options, 'since')
+        until = self.parse_date_option(options, 'until')
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        def progress(totals):
+            self.stdout.write(
+                f"{totals['items']} items up to id {totals['last_id']}, "
+                f"{totals['items_per_second']:.1f} items/sec"
+            )
+
+        self.stdout.write(f"Backfill run {make_run_id(options['customer'], since, until)}")
+        totals = run_backfill(
+            customer_name=options['customer'],
+            since=since,
+            until=until,
+            chunk_size=options['chunk_size'],
+            resume=options['resume'],
+            dispatch=options['dispatch'],
+            progress=progress,
+        )
+
+        verb = "dispatched" if options['dispatch'] else f"re-extracted ({totals['failed']} failed)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['items']} items {verb} in {totals['seconds']:.1f}s, {totals['items_per_second']:.1f} items/sec"
+        ))
+
+    @staticmethod
+    def parse_date_option(options, name):
+        if not options[name]:
+            return None
+        try:
+            value = parse_date(options[name])
+        except ValueError:
+            value = None
+        if value is None:
+            raise CommandError(f"--{name} must be a date in YYYY-MM-DD format")
+        return value
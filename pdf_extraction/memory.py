@@ -0,0 +1,51 @@
+import contextvars
+import os
+import resource
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_active_tracker: contextvars.ContextVar[Optional['PeakRSSTracker']] = contextvars.ContextVar(
+    'pdf_extraction_rss_tracker', default=None
+)
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, falling back to the lifetime peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSSTracker:
+    """Records the highest RSS sampled while a document is being processed"""
+
+    def __init__(self):
+        self.start_bytes = current_rss_bytes()
+        self.peak_bytes = self.start_bytes
+
+    def sample(self) -> None:
+        rss = current_rss_bytes()
+        if rss > self.peak_bytes:
+            self.peak_bytes = rss
+
+
+@contextmanager
+def track_peak_rss() -> Iterator[PeakRSSTracker]:
+    """Make a tracker active for the current context; page extraction samples it after every page"""
+    tracker = PeakRSSTracker()
+    token = _active_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        tracker.sample()
+        _active_tracker.reset(token)
+
+
+def sample_rss() -> None:
+    """Sample RSS into the active tracker, if any"""
+    tracker = _active_tracker.get()
+    if tracker is not None:
+        tracker.sample()
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+def mark_processed_items_done(apps, schema_editor):
+    # Items extracted before the Celery pipeline existed already hold their results
+    PDFExtractionItem = apps.get_model('pdf_extraction', 'PDFExtractionItem')
+    PDFExtractionItem.objects.filter(result_data__isnull=False).update(status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_extraction', '0005_alter_pdfextraction_customer_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfextractionitem',
+            name='error_message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='pdfextractionitem',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfextractionitem',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfextractionitem',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfextractionitem',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+        migrations.RunPython(mark_processed_items_done, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_extraction', '0006_pdfextractionitem_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfextractionitem',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_extraction', '0007_pdfextractionitem_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfextractionitem',
+            name='peak_rss_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_extraction', '0008_pdfextractionitem_peak_rss_bytes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PDFTextArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('extraction_version', models.IntegerField()),
+                ('compressed_text', models.BinaryField()),
+                ('page_offsets', models.JSONField(default=list)),
+                ('page_count', models.IntegerField(default=0)),
+                ('character_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pdf_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='text_artifact', to='pdf_extraction.pdfextractionitem')),
+            ],
+            options={
+                'verbose_name': 'PDF Text Artifact',
+                'verbose_name_plural': 'PDF Text Artifacts',
+            },
+        ),
+    ]
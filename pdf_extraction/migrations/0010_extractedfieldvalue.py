@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_extraction', '0009_pdftextartifact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedFieldValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(max_length=255)),
+                ('field_name', models.CharField(max_length=255)),
+                ('row_index', models.IntegerField(blank=True, null=True)),
+                ('value_text', models.TextField(blank=True, null=True)),
+                ('value_number', models.DecimalField(blank=True, decimal_places=4, max_digits=20, null=True)),
+                ('value_date', models.DateField(blank=True, null=True)),
+                ('pdf_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='field_values', to='pdf_extraction.pdfextractionitem')),
+            ],
+            options={
+                'verbose_name': 'Extracted Field Value',
+                'verbose_name_plural': 'Extracted Field Values',
+                'indexes': [models.Index(fields=['customer_name', 'field_name', 'value_number'], name='pdf_extract_custome_11d7f1_idx'), models.Index(fields=['customer_name', 'field_name', 'value_date'], name='pdf_extract_custome_62ecba_idx'), models.Index(fields=['pdf_item', 'field_name', 'row_index'], name='pdf_extract_pdf_ite_49507d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_extraction', '0010_extractedfieldvalue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdftextartifact',
+            name='page_policy',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
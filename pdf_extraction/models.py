@@ -1,3 +1,5 @@
+import zlib
+
 from django.db import models
 
 
@@ -25,6 +27,17 @@ class PDFExtraction(models.Model):
 
 
 class PDFExtractionItem(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
     pdf_extraction = models.ForeignKey('PDFExtraction', on_delete=models.CASCADE, related_name='pdf_items')
     pdf_file_name = models.CharField(max_length=255, blank=True)
     pdf_file = models.FileField(upload_to='pdf/')
@@ -34,6 +47,17 @@ class PDFExtractionItem(models.Model):
     updated_by = models.CharField(max_length=150, null=True, blank=True )
     result_data = models.JSONField(blank=True, null=True)
 
+    # Processing state, maintained by the Celery extraction pipeline
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    # SHA-256 of the PDF content that result_data was extracted from
+    content_hash = models.CharField(max_length=64, blank=True)
+    # Highest resident memory of the worker while this item was processed
+    peak_rss_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+
     class Meta:
         verbose_name = 'PDF Extraction Item'
         verbose_name_plural = 'PDF Extraction Items'
@@ -57,4 +81,75 @@ class PDFExtractionItem(models.Model):
         if self.pdf_file:
             self.extract_file_name()
 
+        # A freshly assigned upload has not been committed to storage yet
+        self._pdf_file_changed = bool(self.pdf_file) and not self.pdf_file._committed
+
         super().save(*args, **kwargs)
+
+
+class PDFTextArtifact(models.Model):
+    """Extracted text of a PDF item, stored compressed so rules can be re-run without re-parsing"""
+    pdf_item = models.OneToOneField('PDFExtractionItem', on_delete=models.CASCADE, related_name='text_artifact')
+    content_hash = models.CharField(max_length=64)
+    extraction_version = models.IntegerField()
+    compressed_text = models.BinaryField()
+    # [page_number, start, end] character offsets of every page within the text
+    page_offsets = models.JSONField(default=list)
+    page_count = models.IntegerField(default=0)
+    character_count = models.IntegerField(default=0)
+    # Page policy of the customer's rule set the text was read under, empty for the whole document
+    page_policy = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'PDF Text Artifact'
+        verbose_name_plural = 'PDF Text Artifacts'
+
+    def __str__(self):
+        return f'Text of {self.pdf_item_id}'
+
+    @property
+    def text(self) -> str:
+        return zlib.decompress(bytes(self.compressed_text)).decode('utf-8')
+
+    def set_text(self, text: str) -> None:
+        for name, value in self.text_fields(text).items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def text_fields(text: str) -> dict:
+        """The stored fields of ``text``, for writes that do not go through an instance"""
+        return {'compressed_text': zlib.compress(text.encode('utf-8')), 'character_count': len(text)}
+
+    def page_text(self, page_number: int) -> str:
+        """Return the text of a single page, using the stored offsets"""
+        for number, start, end in self.page_offsets:
+            if number == page_number:
+                return self.text[start:end]
+        raise KeyError(page_number)
+
+
+class ExtractedFieldValue(models.Model):
+    """One extracted header field or item cell of a PDF item, typed and indexed for reporting queries"""
+    pdf_item = models.ForeignKey('PDFExtractionItem', on_delete=models.CASCADE, related_name='field_values')
+    # Copied from the extraction so customer filters do not need a join
+    customer_name = models.CharField(max_length=255)
+    field_name = models.CharField(max_length=255)
+    # Line item row, null for header fields
+    row_index = models.IntegerField(null=True, blank=True)
+    value_text = models.TextField(null=True, blank=True)
+    value_number = models.DecimalField(max_digits=20, decimal_places=4, null=True, blank=True)
+    value_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Extracted Field Value'
+        verbose_name_plural = 'Extracted Field Values'
+        indexes = [
+            models.Index(fields=['customer_name', 'field_name', 'value_number']),
+            models.Index(fields=['customer_name', 'field_name', 'value_date']),
+            models.Index(fields=['pdf_item', 'field_name', 'row_index']),
+        ]
+
+    def __str__(self):
+        return f'{self.field_name}: {self.value_text}'
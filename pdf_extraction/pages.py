@@ -0,0 +1,50 @@
+import re
+from typing import List, Optional, Tuple
+
+PAGE_RANGE_RE = re.compile(r'^(-?\d+)(?:-(-?\d+))?$')
+
+PageRanges = List[Tuple[int, int]]
+
+# Ranges selecting every page of a document
+ALL_PAGES: PageRanges = [(1, -1)]
+
+
+def parse_page_selector(selector: str) -> PageRanges:
+    """
+    Parse a page selector such as ``1-3,-1`` into ``(first, last)`` page ranges.
+
+    Pages are numbered from 1, negative numbers count from the last page (``-1`` is the
+    last page) and a single number selects one page. Raises ValueError on anything else.
+    """
+    ranges = []
+    for part in selector.replace(' ', '').split(','):
+        match = PAGE_RANGE_RE.match(part)
+        if not match:
+            raise ValueError(f"Invalid page range '{part}', expected a page such as 2 or -1, or a range such as 1-3")
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) is not None else first
+        if first == 0 or last == 0:
+            raise ValueError(f"Invalid page range '{part}', pages are numbered from 1")
+        ranges.append((first, last))
+    return ranges
+
+
+def format_page_ranges(ranges: PageRanges) -> str:
+    """Canonical form of parsed page ranges, for cache keys"""
+    return ','.join(str(first) if first == last else f'{first}-{last}' for first, last in ranges)
+
+
+def select_pages(ranges: PageRanges, page_count: int, max_pages: Optional[int] = None) -> List[int]:
+    """
+    Page numbers of a document selected by ``ranges``, in document order without repeats.
+
+    Pages beyond the document are ignored. With ``max_pages`` only the selected pages
+    up to that page number are kept.
+    """
+    last_page = min(page_count, max_pages) if max_pages else page_count
+    selected = set()
+    for first, last in ranges:
+        first = first if first > 0 else page_count + first + 1
+        last = last if last > 0 else page_count + last + 1
+        selected.update(range(max(first, 1), min(last, last_page) + 1))
+    return sorted(selected)
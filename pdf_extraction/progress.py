@@ -0,0 +1,182 @@
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CHANNEL = 'pdf_extraction:progress:{extraction_id}'
+
+_active_item: contextvars.ContextVar[Optional[Tuple[int, int]]] = contextvars.ContextVar(
+    'pdf_extraction_progress_item', default=None
+)
+
+
+def progress_channel(extraction_id: int) -> str:
+    return PROGRESS_CHANNEL.format(extraction_id=extraction_id)
+
+
+def encode_event(event: Dict[str, Any]) -> str:
+    return json.dumps(event, cls=DjangoJSONEncoder)
+
+
+# Publishing, from the Celery workers
+# ------------------------------------------------------------------------------
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                import redis
+
+                _publisher = redis.Redis.from_url(
+                    settings.PDF_PROGRESS_REDIS_URL, socket_connect_timeout=1, socket_timeout=1
+                )
+    return _publisher
+
+
+def publish_progress(extraction_id: int, event: Dict[str, Any]) -> None:
+    """Publish a progress event of an extraction job; progress is best effort and never fails extraction"""
+    if not settings.PDF_PROGRESS_REDIS_URL:
+        return
+    import redis
+
+    try:
+        _get_publisher().publish(progress_channel(extraction_id), encode_event(dict(event, job_id=extraction_id)))
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish progress of extraction {extraction_id}: {str(e)}")
+
+
+def publish_item_status(extraction_id: int, item_id: int, status: str, **fields: Any) -> None:
+    """Publish a state transition of an item once the current transaction commits"""
+    event = dict(fields, type='item', item_id=item_id, status=status)
+    transaction.on_commit(lambda: publish_progress(extraction_id, event))
+
+
+@contextmanager
+def progress_scope(extraction_id: int, item_id: int) -> Iterator[None]:
+    """Attribute page progress reported in the current context to an item"""
+    token = _active_item.set((extraction_id, item_id))
+    try:
+        yield
+    finally:
+        _active_item.reset(token)
+
+
+def report_pages(pages: Iterable[Tuple[int, str]], page_count: int) -> Iterator[Tuple[int, str]]:
+    """Pass pages through, publishing a page event for each when a progress scope is active"""
+    active = _active_item.get()
+    for page_number, page_text in pages:
+        if active is not None:
+            extraction_id, item_id = active
+            publish_progress(extraction_id, {
+                'type': 'page', 'item_id': item_id, 'page': page_number, 'page_count': page_count,
+            })
+        yield page_number, page_text
+
+
+# Subscribing, on the ASGI workers
+# ------------------------------------------------------------------------------
+
+class ProgressHub:
+    """
+    Fans progress events out to the WebSocket connections of this process.
+
+    One Redis pub/sub connection per process is shared by all subscribers: a job's
+    channel is subscribed while at least one connection follows it, and every event
+    is put on the queue of each of its subscribers. A slow subscriber loses its oldest
+    events rather than holding up the others.
+    """
+
+    def __init__(self, url: str, queue_size: int = 100):
+        self.url = url
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, extraction_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        async with self._lock:
+            if self._pubsub is None:
+                await self._connect()
+            subscribers = self._subscribers.setdefault(extraction_id, set())
+            if not subscribers:
+                await self._pubsub.subscribe(progress_channel(extraction_id))
+            subscribers.add(queue)
+            # The reader needs a subscribed connection, so it is started after the first subscription
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, extraction_id: int, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            subscribers = self._subscribers.get(extraction_id)
+            if not subscribers or queue not in subscribers:
+                return
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[extraction_id]
+                await self._pubsub.unsubscribe(progress_channel(extraction_id))
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    async def _connect(self) -> None:
+        """Open the pub/sub connection, subscribing the channels of the current subscribers"""
+        import redis.asyncio
+
+        self._pubsub = redis.asyncio.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+        if self._subscribers:
+            await self._pubsub.subscribe(*[progress_channel(extraction_id) for extraction_id in self._subscribers])
+
+    async def _read(self) -> None:
+        import redis
+
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except (redis.RedisError, OSError) as e:
+                logger.warning(f"Progress subscription lost: {str(e)}, reconnecting")
+                await asyncio.sleep(1)
+                try:
+                    async with self._lock:
+                        await self._connect()
+                except (redis.RedisError, OSError):
+                    pass
+                continue
+            if message is not None:
+                self.dispatch(message['channel'], message['data'])
+
+    def dispatch(self, channel: bytes, data: bytes) -> None:
+        """Put a published event on the queue of every subscriber of its job"""
+        extraction_id = int(channel.decode().rsplit(':', 1)[1])
+        text = data.decode()
+        for queue in list(self._subscribers.get(extraction_id, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(text)
+
+
+_hub: Optional[ProgressHub] = None
+
+
+def get_progress_hub() -> ProgressHub:
+    """Return the progress hub of this process"""
+    global _hub
+    if _hub is None:
+        _hub = ProgressHub(settings.PDF_PROGRESS_REDIS_URL, queue_size=settings.PDF_PROGRESS_QUEUE_SIZE)
+    return _hub
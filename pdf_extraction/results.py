@@ -0,0 +1,142 @@
+import logging
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import touch_jobs
+from .models import ExtractedFieldValue, PDFExtractionItem
+from .progress import publish_item_status
+
+logger = logging.getLogger(__name__)
+
+# Extraction output together with the processing state recorded when it is written
+RESULT_FIELDS = ('result_data', 'updated_at', 'status', 'finished_at', 'content_hash', 'peak_rss_bytes')
+
+# Keys of result_data that are not extracted fields
+RESULT_META_KEYS = ('items', 'timed_out_rules')
+
+NUMBER_RE = re.compile(r'^[-+]?(\d{1,3}(,\d{3})+|\d+)(\.\d+)?$')
+# 150.000 is 150 with a decimal point but 150000 with dots grouping the thousands
+AMBIGUOUS_NUMBER_RE = re.compile(r'^[-+]?\d{1,3}(\.\d{3})+$')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %b %Y', '%d %B %Y')
+
+
+def parse_number(value: str) -> Optional[Decimal]:
+    """
+    Numeric value of an extracted string such as ``1,250.00``, or None.
+
+    Only a decimal point with optional comma thousands separators is read. Decimal-comma
+    forms such as ``1.250,00`` and dot-grouped forms such as ``150.000``, which could be
+    either convention, are kept as text only.
+    """
+    value = value.strip()
+    if not NUMBER_RE.match(value) or AMBIGUOUS_NUMBER_RE.match(value):
+        return None
+    try:
+        number = Decimal(value.replace(',', ''))
+    except InvalidOperation:
+        return None
+    # Values that do not fit the column are kept as text only
+    return number if abs(number) < Decimal('1e16') else None
+
+
+def parse_date_value(value: str) -> Optional[date]:
+    """Date value of an extracted string in one of DATE_FORMATS, or None"""
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def iter_field_values(item: PDFExtractionItem, result_data: Optional[Dict[str, Any]]) -> Iterator[ExtractedFieldValue]:
+    """Rows of the field value table for one item's result_data"""
+    if not isinstance(result_data, dict):
+        return
+    customer_name = item.pdf_extraction.customer_name
+
+    def row(field_name, value, row_index=None):
+        text = None if value is None else str(value)
+        return ExtractedFieldValue(
+            pdf_item_id=item.id,
+            customer_name=customer_name,
+            field_name=field_name,
+            row_index=row_index,
+            value_text=text,
+            value_number=parse_number(text) if text else None,
+            value_date=parse_date_value(text) if text else None,
+        )
+
+    for field_name, value in result_data.items():
+        if field_name not in RESULT_META_KEYS:
+            yield row(field_name, value)
+    for row_index, line_item in enumerate(result_data.get('items') or []):
+        for field_name, value in line_item.items():
+            yield row(field_name, value, row_index)
+
+
+class ResultWriter:
+    """
+    Batched writer for system-generated extraction results.
+
+    Results are set on the item instances and written with one bulk_update per batch,
+    so model validation, save() and post_save are skipped: these writes never queue
+    the item again. When result_data is written, the items' rows in the field value
+    table are replaced in the same transaction. Use it as a context manager so the last
+    partial batch is written, also when processing stops on an error.
+
+    Batches only form where one task writes many items, as the backfill does. Live
+    extractions run one item per task and write with ``batch_size=1``.
+    """
+
+    def __init__(self, fields: Sequence[str] = RESULT_FIELDS, batch_size: Optional[int] = None):
+        self.fields = list(fields)
+        self.batch_size = batch_size or settings.PDF_RESULT_WRITE_BATCH_SIZE
+        self.pending: List[PDFExtractionItem] = []
+        self.written = 0
+
+    def add(self, item: PDFExtractionItem, result_data: Any, **fields: Any) -> None:
+        """Queue the result of an item, with any other of the writer's fields, for the next batch"""
+        item.result_data = result_data
+        item.updated_at = timezone.now()
+        for name, value in fields.items():
+            if name not in self.fields:
+                raise ValueError(f"{name} is not written by this result writer")
+            setattr(item, name, value)
+        self.pending.append(item)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write the queued results, returning how many items were written"""
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, []
+        with transaction.atomic():
+            PDFExtractionItem.objects.bulk_update(pending, self.fields)
+            if 'result_data' in self.fields:
+                ExtractedFieldValue.objects.filter(pdf_item__in=pending).delete()
+                ExtractedFieldValue.objects.bulk_create(
+                    [value for item in pending for value in iter_field_values(item, item.result_data)],
+                    batch_size=1000,
+                )
+        touch_jobs(item.pdf_extraction_id for item in pending)
+        if 'status' in self.fields:
+            for item in pending:
+                publish_item_status(item.pdf_extraction_id, item.id, item.status)
+        self.written += len(pending)
+        logger.debug(f"Wrote results of {len(pending)} PDF items")
+        return len(pending)
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.flush()
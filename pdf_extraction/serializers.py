@@ -1,5 +1,12 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from regex_engine.models import CustomerRegexRule
+
+from .models import PDFExtraction
+from .models import PDFExtractionItem
+from .pages import parse_page_selector
+
 
 class PDFTextExtractionSerializer(serializers.Serializer):
     """Serializer for PDF text extraction"""
@@ -7,6 +14,22 @@ class PDFTextExtractionSerializer(serializers.Serializer):
         required=True,
         help_text="PDF file to extract text from"
     )
+    pages = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        max_length=200,
+        help_text="Pages to extract, such as '1-3,-1'; negative numbers count from the last page. All pages by default"
+    )
+    stream = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Stream each page's text as soon as it is parsed instead of after the whole document"
+    )
+    page_markers = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="When streaming, precede every page with a '--- Page N ---' line"
+    )
 
     def validate_pdf_file(self, value):
         """Validate that the uploaded file is a PDF"""
@@ -19,9 +42,184 @@ class PDFTextExtractionSerializer(serializers.Serializer):
 
         return value
 
+    def validate_pages(self, value):
+        """Validate the page selector"""
+        if value:
+            try:
+                parse_page_selector(value)
+            except ValueError as e:
+                raise serializers.ValidationError(str(e))
+        return value
+
+
+class PDFBatchExtractionSerializer(serializers.Serializer):
+    """Serializer for a multi-file regex extraction job"""
+    customer_name = serializers.ChoiceField(
+        choices=PDFExtraction._meta.get_field('customer_name').choices,
+        help_text="Customer whose regex rules are applied"
+    )
+    customer_id = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        max_length=100,
+        help_text="Customer identifier"
+    )
+    pdf_files = serializers.ListField(
+        child=serializers.FileField(),
+        allow_empty=False,
+        help_text="PDF files to extract, repeat the field for every file"
+    )
+
+    def validate_pdf_files(self, value):
+        """Validate the number of files and that every file is a PDF within the size limit"""
+        if len(value) > settings.PDF_BATCH_MAX_FILES:
+            raise serializers.ValidationError(f"A batch must not contain more than {settings.PDF_BATCH_MAX_FILES} files")
+
+        for pdf_file in value:
+            PDFTextExtractionSerializer().validate_pdf_file(pdf_file)
+
+        return value
+
+
+class PDFBatchExtractionResponseSerializer(serializers.Serializer):
+    """Serializer for a created extraction job"""
+    job_id = serializers.IntegerField(help_text="Id of the created extraction")
+    item_count = serializers.IntegerField(help_text="Number of queued PDF items")
+    status = serializers.CharField(help_text="Initial state of the items")
+
+
+class ExtractionItemStatusSerializer(serializers.Serializer):
+    """Serializer for the processing state of one PDF item"""
+    id = serializers.IntegerField(help_text="PDF extraction item")
+    pdf_file_name = serializers.CharField(help_text="PDF file name")
+    status = serializers.ChoiceField(choices=PDFExtractionItem.STATUS_CHOICES, help_text="Processing state")
+    queued_at = serializers.DateTimeField(allow_null=True, help_text="When the item was queued")
+    started_at = serializers.DateTimeField(allow_null=True, help_text="When a worker started processing")
+    finished_at = serializers.DateTimeField(allow_null=True, help_text="When processing ended")
+    queue_seconds = serializers.FloatField(allow_null=True, help_text="Time spent waiting for a worker")
+    processing_seconds = serializers.FloatField(allow_null=True, help_text="Time spent processing")
+    error_message = serializers.CharField(help_text="Error of a failed item")
+    peak_rss_bytes = serializers.IntegerField(allow_null=True, help_text="Peak worker memory while processing")
+
+
+class ExtractionStatusSerializer(serializers.Serializer):
+    """Serializer for the status of an extraction job"""
+    job_id = serializers.IntegerField(help_text="Extraction id")
+    customer_name = serializers.CharField(help_text="Customer")
+    created_at = serializers.DateTimeField(help_text="When the job was created")
+    complete = serializers.BooleanField(help_text="Whether every item is done or failed")
+    total = serializers.IntegerField(help_text="Number of items")
+    counts = serializers.DictField(child=serializers.IntegerField(), help_text="Number of items per state")
+    progress = serializers.FloatField(help_text="Fraction of items that are done or failed")
+    started_at = serializers.DateTimeField(allow_null=True, help_text="When the first item started")
+    finished_at = serializers.DateTimeField(allow_null=True, help_text="When the last item finished, once complete")
+    elapsed_seconds = serializers.FloatField(allow_null=True, help_text="Processing wall time, once complete")
+    results_updated_at = serializers.DateTimeField(allow_null=True, help_text="When a result was last written")
+    items = ExtractionItemStatusSerializer(many=True, help_text="State of every item")
+
+
+class ExtractionItemResultSerializer(serializers.Serializer):
+    """Serializer for the extracted data of one PDF item"""
+    item_id = serializers.IntegerField(help_text="PDF extraction item")
+    pdf_file_name = serializers.CharField(help_text="PDF file name")
+    status = serializers.ChoiceField(choices=PDFExtractionItem.STATUS_CHOICES, help_text="Processing state")
+    result_data = serializers.JSONField(allow_null=True, help_text="Extracted header fields and items")
+
+
+class ExtractionResultsSerializer(serializers.Serializer):
+    """Serializer for the results of an extraction job"""
+    job_id = serializers.IntegerField(help_text="Extraction id")
+    complete = serializers.BooleanField(help_text="Whether every item is done or failed")
+    results = ExtractionItemResultSerializer(many=True, help_text="Extracted data of every item")
+
+
+class PDFPageTextSerializer(serializers.Serializer):
+    """Serializer for the text of one page of a PDF text extraction response"""
+    page = serializers.IntegerField(help_text="Page number, from 1")
+    text = serializers.CharField(help_text="Extracted text of the page, empty when it has none")
+    start = serializers.IntegerField(help_text="Offset of the page's first character in the text download")
+    end = serializers.IntegerField(help_text="Offset just after the page's last character in the text download")
+    seconds = serializers.FloatField(help_text="Time taken to extract the page")
+
 
 class PDFTextExtractionResponseSerializer(serializers.Serializer):
-    """Serializer for PDF text extraction response"""
-    text = serializers.CharField(help_text="Extracted text from PDF")
-    page_count = serializers.IntegerField(help_text="Number of pages in PDF")
+    """Serializer for PDF text extraction response, as sent for Accept: application/json"""
+    pages = PDFPageTextSerializer(many=True, help_text="Extracted pages in document order")
+    page_count = serializers.IntegerField(help_text="Number of pages extracted")
     character_count = serializers.IntegerField(help_text="Total characters extracted")
+    seconds = serializers.FloatField(help_text="Total time taken to extract the pages")
+
+
+class TextCacheStatsSerializer(serializers.Serializer):
+    """Serializer for extracted text cache statistics"""
+    memory_hits = serializers.IntegerField(help_text="Lookups served by the in-process tier")
+    shared_hits = serializers.IntegerField(help_text="Lookups served by the shared cache tier")
+    misses = serializers.IntegerField(help_text="Lookups that required parsing the PDF")
+    evictions = serializers.IntegerField(help_text="Entries evicted from the in-process tier")
+    lookups = serializers.IntegerField(help_text="Total lookups")
+    entries = serializers.IntegerField(help_text="Entries held by the in-process tier")
+    size_bytes = serializers.IntegerField(help_text="Current size of the in-process tier")
+    max_bytes = serializers.IntegerField(help_text="Size limit of the in-process tier")
+
+
+class CandidateRuleSerializer(serializers.ModelSerializer):
+    """Serializer for one rule of a candidate rule set"""
+    id = serializers.IntegerField(required=False, help_text="Stored rule this candidate stands for, if any")
+
+    class Meta:
+        model = CustomerRegexRule
+        fields = (
+            'id', 'field_name', 'regex_pattern', 'regex_pattern_v2', 'regex_pattern_v3', 'regex_group',
+            'is_item_field', 'is_row_anchor', 'is_untrusted',
+        )
+
+
+class RuleDryRunSerializer(serializers.Serializer):
+    """Serializer for a rule dry-run request"""
+    customer_name = serializers.ChoiceField(
+        choices=CustomerRegexRule._meta.get_field('customer_name').choices,
+        help_text="Customer whose stored documents are used as sample"
+    )
+    rules = CandidateRuleSerializer(
+        many=True,
+        required=False,
+        help_text="Complete candidate rule set, the customer's stored rules when omitted"
+    )
+    sample_size = serializers.IntegerField(
+        default=100,
+        min_value=1,
+        help_text="Number of latest documents to evaluate"
+    )
+
+    def validate_sample_size(self, value):
+        if value > settings.REGEX_DRY_RUN_MAX_SAMPLE:
+            raise serializers.ValidationError(f"Sample size must not exceed {settings.REGEX_DRY_RUN_MAX_SAMPLE}")
+        return value
+
+
+class RuleDryRunChangeSerializer(serializers.Serializer):
+    """Serializer for one changed value in a dry-run document"""
+    row = serializers.IntegerField(required=False, help_text="Item row, for item fields")
+    field = serializers.CharField(help_text="Field name")
+    current = serializers.JSONField(help_text="Value in the stored result_data")
+    candidate = serializers.JSONField(help_text="Value produced by the candidate rules")
+
+
+class RuleDryRunDocumentSerializer(serializers.Serializer):
+    """Serializer for the dry-run outcome of one document"""
+    item_id = serializers.IntegerField(help_text="PDF extraction item")
+    pdf_file_name = serializers.CharField(help_text="PDF file name")
+    changed = serializers.BooleanField(help_text="Whether any value would change")
+    fields = RuleDryRunChangeSerializer(many=True, help_text="Changed header fields")
+    items = RuleDryRunChangeSerializer(many=True, help_text="Changed item cells")
+    timed_out_rules = serializers.ListField(child=serializers.DictField(), help_text="Rules aborted by their time budget")
+
+
+class RuleDryRunResponseSerializer(serializers.Serializer):
+    """Serializer for a rule dry-run response"""
+    customer_name = serializers.CharField(help_text="Customer")
+    documents = serializers.IntegerField(help_text="Documents evaluated")
+    changed = serializers.IntegerField(help_text="Documents with at least one changed value")
+    changed_fields = serializers.DictField(child=serializers.IntegerField(), help_text="Documents changed per field")
+    seconds = serializers.FloatField(help_text="Evaluation time")
+    results = RuleDryRunDocumentSerializer(many=True, help_text="Per-document differences")
@@ -1,67 +1,354 @@
+import hashlib
+import io
 import logging
-from typing import Optional, Dict, Any, List
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, BinaryIO, Iterable, Iterator, List, Tuple, Union
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.utils import timezone
 
 import regex_engine
-from .models import PDFExtraction, PDFExtractionItem
-from regex_engine.models import CustomerRegexRule
+from .cache import get_text_cache, sha256_file
+from .executor import process_pool
+from .memory import sample_rss, track_peak_rss
+from .jobs import touch_jobs
+from .models import PDFExtraction, PDFExtractionItem, PDFTextArtifact
+from .pages import ALL_PAGES, PageRanges, format_page_ranges, parse_page_selector, select_pages
+from .progress import progress_scope, publish_item_status, report_pages
+from .results import ResultWriter
+from regex_engine.guard import TIMED_OUT, RuleTimeout, time_budget
+from regex_engine.rules import CompiledRuleSet, get_rule_set, record_rule_timeouts
+from regex_engine.stats import get_pattern_stats
 
 logger = logging.getLogger(__name__)
 
+# Line preceding each page in streamed text when page markers are requested
+PAGE_MARKER = "--- Page {page_number} ---\n"
+
+# A PDF is parsed from a path or from a seekable binary stream such as an in-memory upload
+PDFSource = Union[str, BinaryIO]
+
+
+def describe_source(file_path: PDFSource) -> str:
+    """Name of a PDF source for log messages"""
+    return file_path if isinstance(file_path, str) else 'in-memory upload'
+
+
+def iter_pdf_pages(
+    file_path: PDFSource, start: int = 0, stop: Optional[int] = None,
+    ranges: Optional[PageRanges] = None, max_pages: Optional[int] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily yield ``(page_number, text)`` for pages ``start`` to ``stop`` (zero based, exclusive).
+
+    With ``ranges`` or ``max_pages`` only the pages they select are parsed, see select_pages.
+
+    Pages without text yield an empty string. The PDF stays open only while the
+    generator is consumed, so callers can stop early by closing or abandoning it.
+    Each page's cached layout objects are released as soon as its text is taken,
+    keeping memory roughly constant regardless of page count.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+        if ranges is not None or max_pages:
+            selected = [pdf.pages[number - 1] for number in select_pages(ranges or ALL_PAGES, page_count, max_pages)]
+        else:
+            selected = pdf.pages[start:stop]
+        for page in selected:
+            logger.debug(f"Processing page {page.page_number} of {page_count}")
+            page_text = page.extract_text() or ""
+            page.close()
+            sample_rss()
+            yield page.page_number, page_text
+
+
+def _extract_page_texts(file_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract a page slice eagerly, so it can be returned from a process pool worker"""
+    return list(iter_pdf_pages(file_path, start, stop))
+
+
+def _extract_page_texts_parallel(file_path: str, page_count: int, max_workers: int) -> Iterator[Tuple[int, str]]:
+    """Split the page range across a bounded process pool, each worker parsing its own slice"""
+    workers = min(max_workers, page_count)
+    slice_size = math.ceil(page_count / workers)
+    slices = [(start, min(start + slice_size, page_count)) for start in range(0, page_count, slice_size)]
+    logger.info(f"Extracting {page_count} pages of {file_path} with {len(slices)} worker processes")
+
+    with process_pool(workers) as pool:
+        results = [pool.apply_async(_extract_page_texts, (file_path, start, stop)) for start, stop in slices]
+        # Yield in submission order so pages are reassembled in document order
+        for result in results:
+            yield from result.get()
+
+
+def stop_when_complete(pages: Iterable[Tuple[int, str]], is_complete) -> Iterator[Tuple[int, str]]:
+    """Pass pages through until ``is_complete(page_text)`` reports that enough has been read"""
+    for page_number, page_text in pages:
+        yield page_number, page_text
+        if is_complete(page_text):
+            logger.info(f"Stopped reading after page {page_number}, every header field has matched")
+            return
+
+
+def iter_document_pages(
+    document: Dict[str, Any], ranges: Optional[PageRanges] = None, rule_set: Optional[CompiledRuleSet] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield ``(page_number, text)`` of an extracted document, only the pages selected by
+    ``ranges`` and the max_pages policy of ``rule_set`` when given.
+    """
+    text = document['text']
+    page_offsets = document['page_offsets']
+    max_pages = rule_set.max_pages if rule_set is not None else None
+    selected = None
+    if ranges is not None or max_pages:
+        selected = set(select_pages(ranges or ALL_PAGES, len(page_offsets), max_pages))
+    for page_number, start, end in page_offsets:
+        if selected is None or page_number in selected:
+            yield page_number, text[start:end]
+
+
+def join_page_texts(pages: Iterable[Tuple[int, str]]) -> str:
+    """Join ``(page_number, text)`` pairs into one document, one newline after each non-empty page"""
+    return join_pages_with_offsets(pages)[0]
+
+
+def join_pages_with_offsets(pages: Iterable[Tuple[int, str]]) -> Tuple[str, List[List[int]]]:
+    """Like join_page_texts, also returning ``[page_number, start, end]`` offsets of every page"""
+    parts = []
+    page_offsets = []
+    position = 0
+    for page_num, page_text in pages:
+        if page_text:
+            parts.append(page_text + "\n")
+            page_offsets.append([page_num, position, position + len(page_text)])
+            position += len(page_text) + 1
+        else:
+            logger.warning(f"No text found on page {page_num}")
+            page_offsets.append([page_num, position, position])
+    return "".join(parts), page_offsets
+
+
+def iter_page_chunks(pages: Iterable[Tuple[int, str]], page_markers: bool = False) -> Iterator[str]:
+    """
+    Yield the text of ``(page_number, text)`` pairs piece by piece, as join_page_texts joins it.
+
+    With ``page_markers`` every page, also one without text, is preceded by a
+    PAGE_MARKER line so clients can tell where each page starts.
+    """
+    for page_number, page_text in pages:
+        if page_markers:
+            yield PAGE_MARKER.format(page_number=page_number)
+        if page_text:
+            yield page_text + "\n"
+
 
 class PDFExtractionService:
-    def prosess_extraction(self, extraction_id: int) -> None:
-        """Process the PDF extraction for the given extraction ID"""
+    def create_batch(
+        self, customer_name: str, pdf_files: List[Any], customer_id: Optional[str] = None,
+        created_by: Optional[str] = None
+    ) -> PDFExtraction:
+        """Create one extraction with an item per uploaded PDF and queue them all for processing
+
+        Items are inserted with a single bulk_create, which stores the files but sends no
+        post_save, so they are queued here instead of by the signal.
+        """
+        from .tasks import enqueue_pdf_items
+
+        with transaction.atomic():
+            extraction = PDFExtraction.objects.create(
+                customer_name=customer_name, customer_id=customer_id, created_by=created_by, updated_by=created_by
+            )
+            now = timezone.now()
+            items = PDFExtractionItem.objects.bulk_create([
+                PDFExtractionItem(
+                    pdf_extraction=extraction,
+                    pdf_file=pdf_file,
+                    pdf_file_name=os.path.basename(pdf_file.name),
+                    queued_at=now,
+                    created_by=created_by,
+                    updated_by=created_by,
+                )
+                for pdf_file in pdf_files
+            ])
+            enqueue_pdf_items([item.id for item in items], extraction_id=extraction.id)
+
+        logger.info(f"Created extraction {extraction.id} with {len(items)} PDF items for {customer_name}")
+        return extraction
+
+    def reprocess_extraction(self, extraction_id: int) -> int:
+        """Queue every item of the extraction for re-processing, ignoring content fingerprints"""
+        from .tasks import enqueue_pdf_items
+
+        item_ids = list(PDFExtractionItem.objects.filter(pdf_extraction_id=extraction_id).values_list('id', flat=True))
+        enqueue_pdf_items(item_ids, force=True, extraction_id=extraction_id)
+
+        logger.info(f"Queued {len(item_ids)} PDF items of extraction {extraction_id} for re-processing")
+        return len(item_ids)
+
+    def process_item(self, item_id: int, force: bool = False) -> None:
+        """Process a single PDF item and record its queued/running/done/failed state.
+
+        Items whose PDF fingerprint matches the one their result_data was extracted from are
+        skipped unless ``force`` is set. The result and done state are written together in
+        one UPDATE, without save() and post_save.
+        """
         try:
-            extraction = PDFExtraction.objects.get(id=extraction_id)
-        except PDFExtraction.DoesNotExist:
-            logger.error(f"PDFExtraction with id {extraction_id} does not exist.")
+            item = PDFExtractionItem.objects.select_related('pdf_extraction').get(id=item_id)
+        except PDFExtractionItem.DoesNotExist:
+            logger.error(f"PDFExtractionItem with id {item_id} does not exist.")
             return
 
-        pdf_items = extraction.pdf_items.all()
-        for item in pdf_items:
-            self._process_pdf_item(item, extraction.extraction_method, customer_name=extraction.customer_name)
+        extraction = item.pdf_extraction
+        self._set_item_status(item.id, PDFExtractionItem.STATUS_RUNNING, started_at=timezone.now(), error_message='')
+        touch_jobs([extraction.id])
+        publish_item_status(extraction.id, item.id, PDFExtractionItem.STATUS_RUNNING)
 
-    def _process_pdf_item(self, item: PDFExtractionItem, method: str, customer_name: str) -> None:
+        result_data = item.result_data
+        try:
+            with track_peak_rss() as rss_tracker, progress_scope(extraction.id, item.id):
+                content_hash = self.fingerprint_file(item.pdf_file)
+                if not force and item.content_hash == content_hash and item.result_data is not None:
+                    logger.info(f"PDF item {item.id} is unchanged since its last extraction, skipping")
+                else:
+                    result_data = self._process_pdf_item(
+                        item, extraction.extraction_method, customer_name=extraction.customer_name,
+                        content_hash=content_hash
+                    )
+        except Exception as e:
+            if isinstance(e, SoftTimeLimitExceeded):
+                # The result and fingerprint are left as they were, so the item is extracted again when re-queued
+                error_message = f"Extraction exceeded its time limit of {settings.PDF_PROCESS_ITEM_SOFT_TIME_LIMIT} seconds"
+            else:
+                error_message = str(e)
+            logger.error(f"Extraction failed for PDF item {item.id}: {error_message}")
+            self._set_item_status(
+                item.id, PDFExtractionItem.STATUS_FAILED, finished_at=timezone.now(), error_message=error_message
+            )
+            touch_jobs([extraction.id])
+            publish_item_status(extraction.id, item.id, PDFExtractionItem.STATUS_FAILED, error_message=error_message)
+            raise
+
+        logger.info(f"Peak RSS while processing PDF item {item.id}: {rss_tracker.peak_bytes} bytes")
+        done = dict(
+            status=PDFExtractionItem.STATUS_DONE, finished_at=timezone.now(), content_hash=content_hash,
+            peak_rss_bytes=rss_tracker.peak_bytes
+        )
+        # Every Celery task extracts a single item, so there is no other result to batch this
+        # one with, and it is written at once so the job status shows it. Only the backfill,
+        # which rewrites many items in one task, writes in batches (see reextract_items).
+        with ResultWriter(batch_size=1) as writer:
+            writer.add(item, result_data, **done)
+
+    @staticmethod
+    def fingerprint_file(pdf_file) -> str:
+        """Return the SHA-256 hex digest of a stored PDF file"""
+        digest = hashlib.sha256()
+        with pdf_file.open('rb') as f:
+            for chunk in f.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _set_item_status(item_id: int, status: str, **fields) -> None:
+        """Update processing state with a single UPDATE, without running save() or signals"""
+        PDFExtractionItem.objects.filter(id=item_id).update(status=status, **fields)
+
+    def _process_pdf_item(
+        self, item: PDFExtractionItem, method: str, customer_name: str, content_hash: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return the extracted data of an item, its result_data is written by the caller"""
         if method == 'regex':
-            text = self.extract_text_from_pdf(item.pdf_file.path, method)
+            # The customer's page policy decides how much of the PDF is read
+            text = self.get_item_text(item, content_hash=content_hash, rule_set=get_rule_set(customer_name))
             extracted_data = self.extract_data_using_regex(text, customer_name)
 
             # Log the extracted data
             logger.info(f"Extracted data for PDF item {item.id}: {extracted_data}")
-
-            # Save extracted data to result_data field without triggering signals
-            from django.db.models.signals import post_save
-            from .signals import handle_pdf_extraction_item_save
-
-            post_save.disconnect(handle_pdf_extraction_item_save, sender=PDFExtractionItem)
-            item.result_data = extracted_data
-            item.save(update_fields=['result_data', 'updated_at'])
-            post_save.connect(handle_pdf_extraction_item_save, sender=PDFExtractionItem)
-
-            logger.info(f"Successfully saved extracted data for PDF item {item.id}")
+            return extracted_data
 
         if method == 'ai':
             pass  #
 
-    @staticmethod
-    def extract_text_from_pdf(file_path: str, method: str) -> str:
-        """Extract text from PDF using pdfplumber, this function will be return extracted text"""
-        import pdfplumber
+        return item.result_data
+
+    def get_item_text(
+        self, item: PDFExtractionItem, content_hash: Optional[str] = None, rule_set: Optional[CompiledRuleSet] = None
+    ) -> str:
+        """
+        Return the extracted text of a PDF item.
+
+        The stored text artifact is used when it was produced from the same PDF content,
+        extraction version and page policy, so re-running regex rules does not re-parse the
+        PDF. Otherwise the PDF is parsed, as far as the page policy of ``rule_set`` asks,
+        and the artifact is (re)written.
+        """
+        if content_hash is None:
+            content_hash = self.fingerprint_file(item.pdf_file)
+        page_policy = rule_set.page_policy if rule_set is not None else ''
+
+        artifact = PDFTextArtifact.objects.filter(
+            pdf_item=item,
+            content_hash=content_hash,
+            extraction_version=settings.PDF_TEXT_EXTRACTION_VERSION,
+            page_policy=page_policy,
+        ).first()
+        if artifact is not None:
+            logger.info(f"Using stored text artifact for PDF item {item.id}")
+            return artifact.text.strip()
+
+        file_path = item.pdf_file.path
+        document = self.extract_document(file_path, content_hash=content_hash, rule_set=rule_set)
+        self.save_text_artifact(item, content_hash, document, page_policy=page_policy)
+
+        if not document['text'].strip():
+            logger.warning(f"No text could be extracted from {file_path}")
+            return ""
+
+        logger.info(f"Successfully extracted {len(document['text'])} characters from {file_path}")
+        return document['text'].strip()
 
-        try:
-            extracted_text = ""
+    @staticmethod
+    def save_text_artifact(
+        item: PDFExtractionItem, content_hash: str, document: Dict[str, Any], page_policy: str = ''
+    ) -> PDFTextArtifact:
+        """
+        Store the extracted document of an item as a compressed text artifact
+
+        Two workers may store the artifact of the same item at once, update_or_create locks
+        the existing row or retries as an update when the other one created it first.
+        """
+        artifact, _ = PDFTextArtifact.objects.update_or_create(
+            pdf_item=item,
+            defaults=dict(
+                PDFTextArtifact.text_fields(document['text']),
+                content_hash=content_hash,
+                extraction_version=settings.PDF_TEXT_EXTRACTION_VERSION,
+                page_policy=page_policy,
+                page_offsets=document['page_offsets'],
+                page_count=len(document['page_offsets']),
+            ),
+        )
+        return artifact
 
-            with pdfplumber.open(file_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, start=1):
-                    logger.debug(f"Processing page {page_num} of {len(pdf.pages)}")
-                    page_text = page.extract_text()
+    @staticmethod
+    def extract_text_from_pdf(
+        file_path: str, method: str, content_hash: Optional[str] = None, pages: Optional[str] = None
+    ) -> str:
+        """Extract text from PDF using pdfplumber, this function will be return extracted text
 
-                    if page_text:
-                        extracted_text += page_text + "\n"
-                    else:
-                        logger.warning(f"No text found on page {page_num}")
+        ``pages`` limits extraction to a selection such as ``1-3,-1``, see parse_page_selector.
+        """
+        try:
+            extracted_text = PDFExtractionService.extract_raw_text(file_path, content_hash=content_hash, pages=pages)
 
             if not extracted_text.strip():
                 logger.warning(f"No text could be extracted from {file_path}")
@@ -77,11 +364,186 @@ class PDFExtractionService:
             logger.error(f"Error extracting text from PDF {file_path}: {str(e)}")
             raise
 
-    def extract_data_using_regex(self, text, customer_name):
-        """Extract data from text using provided regex rules"""
+    @staticmethod
+    def iter_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+        """Stream ``(page_number, text)`` pairs of a PDF without building the whole document"""
+        return iter_pdf_pages(file_path)
+
+    @staticmethod
+    @contextmanager
+    def spool_upload(uploaded_file) -> Iterator[Tuple[str, str]]:
+        """Write an upload to a temporary file while fingerprinting it, yielding ``(path, sha256)``"""
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                temp_file.write(chunk)
+        try:
+            yield temp_file.name, digest.hexdigest()
+        finally:
+            try:
+                os.unlink(temp_file.name)
+                logger.debug(f"Cleaned up temporary file: {temp_file.name}")
+            except OSError as e:
+                logger.error(f"Error cleaning up temporary file: {str(e)}")
+
+    @staticmethod
+    @contextmanager
+    def open_upload(uploaded_file) -> Iterator[Tuple[PDFSource, str]]:
+        """
+        Yield ``(source, sha256)`` of an uploaded PDF, without copying its bytes where possible.
+
+        Uploads Django spooled to disk, those above FILE_UPLOAD_MAX_MEMORY_SIZE, are parsed
+        from that file and hashed through a memory map of it. Uploads held in memory are
+        parsed from their buffer and hashed through a memoryview. Only other kinds of
+        upload are written to a temporary file first.
+        """
+        if hasattr(uploaded_file, 'temporary_file_path'):
+            file_path = uploaded_file.temporary_file_path()
+            yield file_path, sha256_file(file_path)
+        elif isinstance(getattr(uploaded_file, 'file', None), io.BytesIO):
+            buffer = uploaded_file.file
+            # Release the view straight away, a BytesIO cannot be resized or closed while exported
+            with buffer.getbuffer() as view:
+                content_hash = hashlib.sha256(view).hexdigest()
+            yield buffer, content_hash
+        else:
+            with PDFExtractionService.spool_upload(uploaded_file) as spooled:
+                yield spooled
+
+    @staticmethod
+    def extract_upload_text(uploaded_file, pages: Optional[str] = None) -> str:
+        """Raw text of an uploaded PDF, byte-identical uploads are served from the text cache"""
+        with PDFExtractionService.open_upload(uploaded_file) as (source, content_hash):
+            return PDFExtractionService.extract_raw_text(source, content_hash=content_hash, pages=pages)
+
+    @staticmethod
+    def iter_upload_pages(uploaded_file, pages: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Lazily yield ``(page_number, text)`` for an uploaded PDF, for streaming its text.
+
+        ``pages`` is a page selector such as ``1-3,-1``, see parse_page_selector.
+
+        A cached document is replayed page by page from the text cache. Otherwise pages
+        are yielded as pdfplumber produces them and the document is not cached, which
+        would mean holding all of it, so memory stays bounded by a single page.
+        """
+        with PDFExtractionService.open_upload(uploaded_file) as (source, content_hash):
+            ranges = parse_page_selector(pages) if pages else None
+            cached_document = get_text_cache().get(content_hash)
+            if cached_document is not None:
+                logger.info(f"Extracted text cache hit for streamed upload ({content_hash})")
+                yield from iter_document_pages(cached_document, ranges)
+                return
+            yield from iter_pdf_pages(source, ranges=ranges)
+
+    @staticmethod
+    def extract_raw_text(
+        file_path: PDFSource, content_hash: Optional[str] = None, parallel: Optional[bool] = None,
+        pages: Optional[str] = None
+    ) -> str:
+        """Return the text of every (selected) page joined with newlines, as produced by pdfplumber"""
+        return PDFExtractionService.extract_document(
+            file_path, content_hash=content_hash, parallel=parallel, pages=pages
+        )['text']
+
+    @staticmethod
+    def extract_document(
+        file_path: PDFSource, content_hash: Optional[str] = None, parallel: Optional[bool] = None,
+        pages: Optional[str] = None, rule_set: Optional[CompiledRuleSet] = None
+    ) -> Dict[str, Any]:
+        """
+        Return ``{'text': ..., 'page_offsets': [[page_number, start, end], ...]}`` for a PDF.
+
+        Results are cached by the SHA-256 of the PDF bytes, so byte-identical documents
+        are only parsed once. Pass ``content_hash`` when the digest is already known; it
+        is required when the PDF is given as a stream instead of a path. ``parallel``
+        forces page-parallel parsing on or off; by default it is used for documents above
+        ``PDF_PARALLEL_PAGE_THRESHOLD`` pages, when the PDF is given as a path.
+
+        Only part of the document is read with a ``pages`` selector such as ``1-3,-1``
+        (see parse_page_selector), or under the page policy of a customer's ``rule_set``.
+        Such parts are cached separately, or cut from the whole document when that is
+        already cached.
+        """
+        text_cache = get_text_cache()
+        if content_hash is None:
+            content_hash = sha256_file(file_path)
+
+        ranges = parse_page_selector(pages) if pages else None
+        page_policy = rule_set.page_policy if rule_set is not None else ''
+        cache_key = content_hash
+        if ranges is not None:
+            cache_key += f':pages={format_page_ranges(ranges)}'
+        if page_policy:
+            cache_key += f':{page_policy}'
+
+        cached_document = text_cache.get(cache_key)
+        if cached_document is not None:
+            logger.info(f"Extracted text cache hit for {describe_source(file_path)} ({cache_key})")
+            return cached_document
+
+        whole_document = text_cache.get(content_hash) if cache_key != content_hash else None
+        if whole_document is not None:
+            logger.info(f"Cutting pages of {describe_source(file_path)} from its cached text ({content_hash})")
+            selected = iter_document_pages(whole_document, ranges, rule_set=rule_set)
+            if rule_set is not None and rule_set.stop_when_header_complete:
+                selected = stop_when_complete(selected, rule_set.header_plan.completion_tracker())
+            text, page_offsets = join_pages_with_offsets(selected)
+            document = {'text': text, 'page_offsets': page_offsets}
+        else:
+            document = PDFExtractionService._parse_pdf_document(
+                file_path, parallel=parallel, ranges=ranges, rule_set=rule_set
+            )
+        text_cache.set(cache_key, document)
+        return document
+
+    @staticmethod
+    def _parse_pdf_document(
+        file_path: PDFSource, parallel: Optional[bool] = None, ranges: Optional[PageRanges] = None,
+        rule_set: Optional[CompiledRuleSet] = None
+    ) -> Dict[str, Any]:
+        import pdfplumber
+
+        with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
+
+        max_pages = rule_set.max_pages if rule_set is not None else None
+        stop_early = rule_set is not None and rule_set.stop_when_header_complete
+        max_workers = settings.PDF_PARALLEL_MAX_WORKERS
+        if parallel is None:
+            parallel = page_count >= settings.PDF_PARALLEL_PAGE_THRESHOLD
+        # The workers of the pool open the document by path. Partial reads are serial: they
+        # are short, and stopping early needs the pages in order.
+        if parallel and (
+            max_workers < 2 or not isinstance(file_path, str) or ranges is not None or max_pages or stop_early
+        ):
+            parallel = False
+
+        if parallel:
+            pages = _extract_page_texts_parallel(file_path, page_count, max_workers)
+        else:
+            pages = iter_pdf_pages(file_path, ranges=ranges, max_pages=max_pages)
+        if stop_early:
+            pages = stop_when_complete(pages, rule_set.header_plan.completion_tracker())
+        # Page progress of the item being processed, if any, goes to its job's subscribers
+        pages = report_pages(pages, page_count)
+
+        text, page_offsets = join_pages_with_offsets(pages)
+        return {'text': text, 'page_offsets': page_offsets}
+
+    def extract_data_using_regex(self, text, customer_name, rule_set: Optional[CompiledRuleSet] = None):
+        """Extract data from text using provided regex rules
+
+        A ``rule_set`` given explicitly is a candidate being tried out: its timeouts and
+        pattern hits are reported in the result but not recorded on the stored rules.
+        """
+        # Rules aborted for exceeding their time budget are collected here
+        timed_out = []
+
         # Extract header and item data separately
-        header_data = self.extract_header_data(text, customer_name)
-        item_data = self.extract_item_data(text, customer_name)
+        header_data = self.extract_header_data(text, customer_name, timed_out=timed_out, rule_set=rule_set)
+        item_data = self.extract_item_data(text, customer_name, timed_out=timed_out, rule_set=rule_set)
 
         # Combine both data
         extracted_data = {
@@ -89,33 +551,50 @@ class PDFExtractionService:
             'items': item_data
         }
 
+        if timed_out:
+            extracted_data['timed_out_rules'] = timed_out
+            if rule_set is None:
+                record_rule_timeouts(timed_out)
+
         return extracted_data
 
-    def extract_header_data(self, text: str, customer_name: str) -> Dict[str, Any]:
+    def extract_header_data(
+        self, text: str, customer_name: str, timed_out: Optional[List[Dict[str, Any]]] = None,
+        rule_set: Optional[CompiledRuleSet] = None
+    ) -> Dict[str, Any]:
         """Extract header data from text using regex rules where is_item_field=False"""
-        import re
-
-        # Get header regex rules only (is_item_field=False)
-        header_rules = CustomerRegexRule.objects.filter(
-            customer_name=customer_name,
-            is_item_field=False
-        )
+        # Get header regex rules only (is_item_field=False), precompiled and cached per customer
+        if rule_set is None:
+            rule_set = get_rule_set(customer_name)
+        header_rules = rule_set.header_rules
 
-        if not header_rules.exists():
+        if not header_rules:
             logger.warning(f"No header regex rules found for customer: {customer_name}")
             return {}
 
+        # Evaluate every rule once through the execution plan, cheapest rules first
+        matches = rule_set.header_plan.search(text)
         extracted_data = {}
 
         for rule in header_rules:
             field_name = rule.field_name
-            pattern = rule.regex_pattern
+            pattern = rule.patterns[0]
             group_num = rule.regex_group
 
+            if pattern.regex is None:
+                logger.error(f"Invalid regex pattern for header field '{field_name}': {pattern.source}. Error: {pattern.error}")
+                extracted_data[field_name] = None
+                continue
+
             try:
-                match = re.search(pattern, text, re.MULTILINE | re.DOTALL)
+                match = matches[rule.id]
 
-                if match:
+                if match is TIMED_OUT:
+                    # The rule was aborted by its time budget, the field stays empty
+                    extracted_data[field_name] = None
+                    if timed_out is not None:
+                        timed_out.append({'rule_id': rule.id, 'field_name': field_name, 'pattern': pattern.name})
+                elif match:
                     # Extract the value using the specified group number
                     extracted_value = match.group(group_num)
 
@@ -124,12 +603,9 @@ class PDFExtractionService:
 
                     logger.info(f"Successfully extracted header field '{field_name}': {extracted_value.strip()}")
                 else:
-                    logger.warning(f"No match found for header field '{field_name}' with pattern: {pattern}")
+                    logger.warning(f"No match found for header field '{field_name}' with pattern: {pattern.source}")
                     extracted_data[field_name] = None
 
-            except re.error as e:
-                logger.error(f"Invalid regex pattern for header field '{field_name}': {pattern}. Error: {str(e)}")
-                extracted_data[field_name] = None
             except IndexError:
                 logger.error(f"Group {group_num} not found in regex match for header field '{field_name}'")
                 extracted_data[field_name] = None
@@ -139,34 +615,36 @@ class PDFExtractionService:
 
         return extracted_data
 
-    def extract_item_data(self, text: str, customer_name: str) -> List[Dict[str, Any]]:
+    def extract_item_data(
+        self, text: str, customer_name: str, timed_out: Optional[List[Dict[str, Any]]] = None,
+        rule_set: Optional[CompiledRuleSet] = None
+    ) -> List[Dict[str, Any]]:
         """Extract item data from text using regex rules where is_item_field=True"""
-        import re
-
-        # Get item regex rules only (is_item_field=True)
-        item_rules = CustomerRegexRule.objects.filter(
-            customer_name=customer_name,
-            is_item_field=True
-        ).order_by('id')
-
-        if not item_rules.exists():
+        # Candidate rule sets keep their configured pattern order and leave the hit statistics alone
+        pattern_stats = get_pattern_stats() if rule_set is None else None
+        # Get item regex rules only (is_item_field=True), precompiled and cached per customer
+        if rule_set is None:
+            rule_set = get_rule_set(customer_name)
+        item_rules = rule_set.item_rules
+
+        if not item_rules:
             logger.warning(f"No item regex rules found for customer: {customer_name}")
             return []
 
+        # With a row anchor rule, segment rows once and match every field inside its own row
+        if rule_set.item_plan is not None:
+            items = rule_set.item_plan.extract(text, timed_out=timed_out)
+            logger.info(f"Total items extracted: {len(items)}")
+            return items
+
         items = []
 
         for rule in item_rules:
             field_name = rule.field_name
             group_num = rule.regex_group
 
-            # Collect all available patterns in order
-            patterns_to_try = []
-            if rule.regex_pattern:
-                patterns_to_try.append(('regex_pattern', rule.regex_pattern))
-            if rule.regex_pattern_v2:
-                patterns_to_try.append(('regex_pattern_v2', rule.regex_pattern_v2))
-            if rule.regex_pattern_v3:
-                patterns_to_try.append(('regex_pattern_v3', rule.regex_pattern_v3))
+            # Available patterns, the one that has matched most often for this rule first
+            patterns_to_try = pattern_stats.order(rule) if pattern_stats else rule.patterns
 
             if not patterns_to_try:
                 logger.warning(f"No patterns available for field '{field_name}'")
@@ -176,10 +654,19 @@ class PDFExtractionService:
             matches_found = []
 
             # Try each pattern in order until we get matches
-            for pattern_name, pattern in patterns_to_try:
+            for pattern in patterns_to_try:
+                pattern_name = pattern.name
+                if pattern.regex is None:
+                    logger.error(f"Invalid regex pattern ({pattern_name}) for field '{field_name}': {pattern.source}. Error: {pattern.error}")
+                    continue  # Try next pattern
+
                 try:
-                    # Use finditer to get all matches for items
-                    matches = list(re.finditer(pattern, text, re.MULTILINE | re.DOTALL))
+                    # Use finditer to get all matches for items, aborting runaway patterns
+                    started = time.perf_counter()
+                    with time_budget():
+                        matches = list(pattern.regex.finditer(text))
+                    if pattern_stats:
+                        pattern_stats.record(rule.id, pattern_name, bool(matches), time.perf_counter() - started)
 
                     if matches:
                         matches_found = matches
@@ -189,8 +676,10 @@ class PDFExtractionService:
                     else:
                         logger.debug(f"No matches found for field '{field_name}' using {pattern_name}, trying next pattern...")
 
-                except re.error as e:
-                    logger.error(f"Invalid regex pattern ({pattern_name}) for field '{field_name}': {pattern}. Error: {str(e)}")
+                except RuleTimeout:
+                    logger.error(f"Pattern ({pattern_name}) for field '{field_name}' exceeded its time budget, rule {rule.id} aborted")
+                    if timed_out is not None:
+                        timed_out.append({'rule_id': rule.id, 'field_name': field_name, 'pattern': pattern_name})
                     continue  # Try next pattern
                 except Exception as e:
                     logger.error(f"Unexpected error with pattern ({pattern_name}) for field '{field_name}': {str(e)}")
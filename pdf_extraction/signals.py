@@ -1,14 +1,20 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from .jobs import touch_jobs
 from .models import PDFExtractionItem
-from .services import PDFExtractionService
+from .tasks import enqueue_pdf_item
 
 
 @receiver(post_save, sender=PDFExtractionItem)
 def handle_pdf_extraction_item_save(sender, instance: PDFExtractionItem, created: bool, **kwargs):
-    # Only process extraction when item is first created, not on updates
-    if created:
-        pdf_service = PDFExtractionService()
-        pdf_service.prosess_extraction(instance.pdf_extraction.id)
+    # Only process extraction when the item is created or its PDF is replaced.
+    # The actual parsing runs on a Celery worker after the upload transaction commits.
+    if created or getattr(instance, '_pdf_file_changed', False):
+        enqueue_pdf_item(instance.id, extraction_id=instance.pdf_extraction_id)
 
+
+@receiver(post_delete, sender=PDFExtractionItem)
+def handle_pdf_extraction_item_delete(sender, instance: PDFExtractionItem, **kwargs):
+    # Removing an item changes the progress of its extraction job
+    touch_jobs([instance.pdf_extraction_id])
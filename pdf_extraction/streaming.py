@@ -0,0 +1,103 @@
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+TEXT = 'text/plain'
+JSON = 'application/json'
+NDJSON = 'application/x-ndjson'
+
+# Media types of the extract-text endpoint, the first is served when the client has no preference
+MEDIA_TYPES = (TEXT, JSON, NDJSON)
+
+
+def iter_page_records(pages: Iterable[Tuple[int, str]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield a record per page with its text, its ``start``/``end`` character offsets within
+    the text join_page_texts would build, and the seconds taken to produce it.
+
+    Time spent by the consumer between two pages is not counted.
+    """
+    position = 0
+    started = time.perf_counter()
+    for page_number, page_text in pages:
+        seconds = time.perf_counter() - started
+        end = position + len(page_text)
+        yield {'page': page_number, 'text': page_text, 'start': position, 'end': end, 'seconds': round(seconds, 6)}
+        if page_text:
+            position = end + 1
+        started = time.perf_counter()
+
+
+class ClosingIterator:
+    """
+    Iterator over ``iterable`` that calls ``release`` once, when it is exhausted, fails or
+    is closed. Unlike a generator's finally block this also runs when iteration never
+    started, as when a client disconnects before the first chunk of a streaming response,
+    which closes its content when the response is closed.
+    """
+
+    def __init__(self, iterable: Iterable[Any], release: Callable[[], None]):
+        self._iterator = iter(iterable)
+        self._release = release
+        self._released = False
+
+    def __iter__(self) -> 'ClosingIterator':
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if not self._released:
+            self._released = True
+            self._release()
+
+
+class _Totals:
+    """Page count, character count and seconds of the page records passed through it"""
+
+    def __init__(self):
+        self.page_count = 0
+        self.character_count = 0
+        self.seconds = 0.0
+
+    def add(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        self.page_count += 1
+        if record['text']:
+            self.character_count = record['end'] + 1
+        self.seconds += record['seconds']
+        return record
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'page_count': self.page_count,
+            'character_count': self.character_count,
+            'seconds': round(self.seconds, 6),
+        }
+
+
+def iter_json_document(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Encode page records as one JSON object, ``{"pages": [...], "page_count": ..., ...}``,
+    a page at a time, so the document is never held as a whole.
+    """
+    totals = _Totals()
+    yield '{"pages": ['
+    for record in records:
+        yield (', ' if totals.page_count else '') + json.dumps(totals.add(record), cls=DjangoJSONEncoder)
+    # The totals are only known after the last page, so they close the object
+    yield '], ' + json.dumps(totals.as_dict())[1:]
+
+
+def iter_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Encode page records as newline-delimited JSON, a ``page`` line each and a closing ``summary`` line"""
+    totals = _Totals()
+    for record in records:
+        yield json.dumps(dict(totals.add(record), type='page'), cls=DjangoJSONEncoder) + "\n"
+    yield json.dumps(dict(totals.as_dict(), type='summary')) + "\n"
@@ -0,0 +1,119 @@
+import logging
+import time
+from typing import List, Optional
+
+from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from django.db import transaction
+from django.utils import timezone
+
+from .backfill import DEFAULT_CHUNK_SIZE, reextract_items, run_backfill
+from .jobs import touch_jobs
+from .models import PDFExtractionItem
+from .progress import publish_item_status
+from .services import PDFExtractionService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(
+    acks_late=True,
+    soft_time_limit=settings.PDF_PROCESS_ITEM_SOFT_TIME_LIMIT,
+    time_limit=settings.PDF_PROCESS_ITEM_TIME_LIMIT,
+)
+def process_pdf_item(item_id: int, force: bool = False) -> None:
+    """Run text and regex extraction for a single PDF item on a Celery worker"""
+    PDFExtractionService().process_item(item_id, force=force)
+
+
+def enqueue_pdf_item(item_id: int, force: bool = False, extraction_id: Optional[int] = None) -> None:
+    """Mark the item as queued and dispatch its extraction once the current transaction commits"""
+    enqueue_pdf_items([item_id], force=force, extraction_id=extraction_id, dispatch=False)
+    transaction.on_commit(lambda: process_pdf_item.delay(item_id, force=force))
+    logger.info(f"Queued extraction for PDF item {item_id}")
+
+
+def enqueue_pdf_items(
+    item_ids: List[int], force: bool = False, extraction_id: Optional[int] = None, dispatch: bool = True
+) -> None:
+    """Like enqueue_pdf_item for many items, marking them queued with a single UPDATE"""
+    items = PDFExtractionItem.objects.filter(id__in=item_ids)
+    items.update(
+        status=PDFExtractionItem.STATUS_QUEUED,
+        queued_at=timezone.now(),
+        started_at=None,
+        finished_at=None,
+        error_message='',
+    )
+    if extraction_id:
+        item_jobs = [(item_id, extraction_id) for item_id in item_ids]
+    else:
+        item_jobs = list(items.values_list('id', 'pdf_extraction_id'))
+    touch_jobs(job_id for _, job_id in item_jobs)
+    for item_id, job_id in item_jobs:
+        publish_item_status(job_id, item_id, PDFExtractionItem.STATUS_QUEUED)
+    if not dispatch:
+        return
+
+    def dispatch_items():
+        for item_id in item_ids:
+            process_pdf_item.delay(item_id, force=force)
+
+    transaction.on_commit(dispatch_items)
+    logger.info(f"Queued extraction for {len(item_ids)} PDF items")
+
+
+@shared_task(
+    acks_late=True,
+    soft_time_limit=settings.PDF_BACKFILL_CHUNK_SOFT_TIME_LIMIT,
+    time_limit=settings.PDF_BACKFILL_CHUNK_TIME_LIMIT,
+)
+def reextract_items_chunk(item_ids: List[int]) -> dict:
+    """
+    Recompute result_data for one backfill chunk
+
+    The backfill checkpoint is already past a dispatched chunk, so when the soft time limit
+    stops it, the items it has not rewritten are queued again as a new chunk.
+    """
+    started = time.perf_counter()
+    started_at = timezone.now()
+    try:
+        result = reextract_items(item_ids)
+    except SoftTimeLimitExceeded:
+        rewritten = PDFExtractionItem.objects.filter(id__in=item_ids, updated_at__gte=started_at)
+        remaining = list(
+            PDFExtractionItem.objects.filter(id__in=item_ids).exclude(id__in=rewritten).values_list('id', flat=True)
+        )
+        if len(remaining) == len(item_ids):
+            # Not even one item fits in the time limit, queueing them again would loop forever
+            logger.error(f"Backfill chunk {item_ids[0]}-{item_ids[-1]} made no progress within its time limit")
+            raise
+        logger.warning(
+            f"Backfill chunk {item_ids[0]}-{item_ids[-1]} hit its time limit, queueing {len(remaining)} items again"
+        )
+        reextract_items_chunk.delay(remaining)
+        return {'updated': len(item_ids) - len(remaining), 'failed': 0, 'requeued': len(remaining)}
+    seconds = time.perf_counter() - started
+    logger.info(
+        f"Backfill chunk of {len(item_ids)} items ({item_ids[0]}-{item_ids[-1]}) done in {seconds:.1f}s, "
+        f"{result['updated']} updated, {result['failed']} failed"
+    )
+    return result
+
+
+@shared_task(acks_late=True)
+def backfill_results(
+    customer_name: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE, resume: bool = True
+) -> dict:
+    """Stream the matching items and fan them out to reextract_items_chunk, dates given as YYYY-MM-DD"""
+    return run_backfill(
+        customer_name=customer_name,
+        since=parse_date(since) if since else None,
+        until=parse_date(until) if until else None,
+        chunk_size=chunk_size,
+        resume=resume,
+        dispatch=True,
+    )
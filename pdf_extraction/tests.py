@@ -1,3 +1,1062 @@
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+
+import billiard
+from asgiref.sync import async_to_sync
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from config.websocket import websocket_application
+from regex_engine import rules as regex_engine_rules
+from regex_engine.models import CustomerExtractionPolicy
+from regex_engine.models import CustomerRegexRule
+from rpa_project.users.tests.factories import UserFactory
+
+from .backfill import get_checkpoint
+from .backfill import make_run_id
+from .backfill import reextract_items
+from .backfill import run_backfill
+from .backfill import set_checkpoint
+from .cache import ExtractedTextCache
+from .cache import get_text_cache
+from .dry_run import DryRunTimeout
+from .dry_run import dry_run_rules
+from .dry_run import rules_as_dicts
+from .executor import BoundedExecutor
+from .jobs import get_job_status
+from .memory import track_peak_rss
+from .models import ExtractedFieldValue
+from .models import PDFExtraction
+from .models import PDFExtractionItem
+from .models import PDFTextArtifact
+from .pages import parse_page_selector
+from .pages import select_pages
+from .progress import ProgressHub
+from .progress import progress_scope
+from .progress import report_pages
+from .results import parse_number
+from .services import PDFExtractionService
+from .services import _extract_page_texts_parallel
+from .services import iter_page_chunks
+from .services import join_page_texts
+from .tasks import process_pdf_item
+from .tasks import reextract_items_chunk
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+SAMPLE_TEXT = "Invoice No: INV-001\nTotal: 150.00"
+SAMPLE_DOCUMENT = {'text': SAMPLE_TEXT + "\n", 'page_offsets': [[1, 0, len(SAMPLE_TEXT)]]}
+
+
+def build_pdf(pages):
+    """Build a minimal PDF with one line of Helvetica text per entry in ``pages``"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode() if text else b""
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return pdf
+
+
+def parse_pages_in_worker_child(file_path, page_count, results):
+    """Parse pages in parallel from a daemonic process, as a Celery prefork child would"""
+    results.put(list(_extract_page_texts_parallel(file_path, page_count, 2)))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PDFExtractionPipelineTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.extraction = PDFExtraction.objects.create(customer_name='Food Hall')
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomerRegexRule.objects.create(
+                customer_name='Food Hall',
+                field_name='invoice_no',
+                regex_pattern=r'Invoice No:\s*(\S+)',
+            )
+
+    def create_item(self, name='invoice.pdf', content=b'%PDF-1.4 invoice'):
+        return PDFExtractionItem.objects.create(
+            pdf_extraction=self.extraction,
+            pdf_file=SimpleUploadedFile(name, content, content_type='application/pdf'),
+        )
+
+    def test_new_item_is_queued_and_dispatched_on_commit(self):
+        with mock.patch('pdf_extraction.tasks.process_pdf_item.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                item = self.create_item()
+
+            delay.assert_not_called()
+            item.refresh_from_db()
+            self.assertEqual(item.status, PDFExtractionItem.STATUS_QUEUED)
+            self.assertIsNotNone(item.queued_at)
+
+            for callback in callbacks:
+                callback()
+            delay.assert_called_once_with(item.id, force=False)
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_process_item_records_result_and_done_state(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item()
+
+        PDFExtractionService().process_item(item.id)
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, PDFExtractionItem.STATUS_DONE)
+        self.assertEqual(item.result_data, {'invoice_no': 'INV-001', 'items': []})
+        self.assertIsNotNone(item.started_at)
+        self.assertIsNotNone(item.finished_at)
+        self.assertGreater(item.peak_rss_bytes, 0)
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', side_effect=ValueError('broken pdf'))
+    def test_process_item_records_failure(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item()
+
+        with self.assertRaises(ValueError):
+            PDFExtractionService().process_item(item.id)
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, PDFExtractionItem.STATUS_FAILED)
+        self.assertEqual(item.error_message, 'broken pdf')
+        self.assertIsNotNone(item.finished_at)
+
+    def test_item_stopped_by_its_time_limit_is_failed_and_extracted_again(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item()
+
+        with mock.patch.object(PDFExtractionService, 'extract_document', side_effect=SoftTimeLimitExceeded()):
+            with self.assertRaises(SoftTimeLimitExceeded):
+                process_pdf_item(item.id)
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, PDFExtractionItem.STATUS_FAILED)
+        self.assertIn('time limit', item.error_message)
+        self.assertIsNone(item.result_data)
+        self.assertEqual(item.content_hash, '')
+
+        with mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT):
+            process_pdf_item(item.id)
+        item.refresh_from_db()
+        self.assertEqual(item.status, PDFExtractionItem.STATUS_DONE)
+        self.assertEqual(item.result_data['invoice_no'], 'INV-001')
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_unchanged_item_is_not_processed_again(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item()
+        service = PDFExtractionService()
+
+        with mock.patch.object(service, 'extract_data_using_regex', wraps=service.extract_data_using_regex) as rules:
+            service.process_item(item.id)
+            service.process_item(item.id)
+            self.assertEqual(rules.call_count, 1)
+
+            service.process_item(item.id, force=True)
+            self.assertEqual(rules.call_count, 2)
+
+        # Forced re-processing re-runs the rules against the stored text artifact
+        self.assertEqual(extract_document.call_count, 1)
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_text_artifact_is_stored_compressed_with_page_offsets(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item()
+
+        PDFExtractionService().process_item(item.id)
+
+        artifact = PDFTextArtifact.objects.get(pdf_item=item)
+        self.assertEqual(artifact.text, SAMPLE_DOCUMENT['text'])
+        self.assertEqual(artifact.page_text(1), SAMPLE_TEXT)
+        self.assertEqual(artifact.page_count, 1)
+        self.assertEqual(artifact.character_count, len(SAMPLE_DOCUMENT['text']))
+
+        # A second worker storing the text of the same item replaces the artifact
+        other_document = {'text': 'Other text', 'page_offsets': [[1, 0, 10]]}
+        PDFExtractionService.save_text_artifact(PDFExtractionItem.objects.get(id=item.id), 'other', other_document)
+        artifact = PDFTextArtifact.objects.get(pdf_item=item)
+        self.assertEqual((artifact.text, artifact.content_hash, artifact.character_count), ('Other text', 'other', 10))
+
+    @override_settings(PDF_RESULT_WRITE_BATCH_SIZE=2)
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_results_are_written_in_batches_without_save(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            items = [self.create_item(f'{index}.pdf', b'%PDF-1.4 ' + bytes([index])) for index in range(3)]
+
+        bulk_update = PDFExtractionItem.objects.bulk_update
+        with mock.patch.object(PDFExtractionItem, 'save') as save, \
+                mock.patch.object(PDFExtractionItem.objects, 'bulk_update', side_effect=bulk_update) as batches:
+            reextract_items([item.id for item in items])
+
+        save.assert_not_called()
+        self.assertEqual([len(call.args[0]) for call in batches.call_args_list], [2, 1])
+        for item in items:
+            item.refresh_from_db()
+            self.assertEqual(item.result_data['invoice_no'], 'INV-001')
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_field_values_are_indexed_with_the_result(self, extract_document):
+        CustomerRegexRule.objects.create(customer_name='Food Hall', field_name='total', regex_pattern=r'Total:\s*(\S+)')
+        CustomerRegexRule.objects.create(
+            customer_name='Food Hall', field_name='qty', regex_pattern=r'Total: (\d+)', is_item_field=True,
+        )
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item()
+        service = PDFExtractionService()
+
+        service.process_item(item.id)
+        service.process_item(item.id, force=True)
+
+        values = {
+            (value.field_name, value.row_index): value
+            for value in ExtractedFieldValue.objects.filter(pdf_item=item)
+        }
+        self.assertEqual(set(values), {('invoice_no', None), ('total', None), ('qty', 0)})
+        self.assertEqual(values[('invoice_no', None)].value_text, 'INV-001')
+        self.assertIsNone(values[('invoice_no', None)].value_number)
+        self.assertEqual(values[('total', None)].value_number, Decimal('150.00'))
+        self.assertEqual(values[('qty', 0)].value_number, Decimal('150'))
+        self.assertTrue(ExtractedFieldValue.objects.filter(
+            customer_name='Food Hall', field_name='total', value_number__gt=100
+        ).exists())
+
+    def test_only_unambiguous_numbers_are_indexed_as_numbers(self):
+        self.assertEqual(parse_number('1,250.00'), Decimal('1250.00'))
+        self.assertEqual(parse_number('-150.5'), Decimal('-150.5'))
+        self.assertEqual(parse_number('1250'), Decimal('1250'))
+        # Thousands grouped with dots, or a decimal comma
+        for value in ('150.000', '1.250.000', '150,00', '1.250,00'):
+            self.assertIsNone(parse_number(value), value)
+
+    @override_settings(REGEX_RULE_TIME_BUDGET=0.2)
+    def test_runaway_rule_is_aborted_and_recorded(self):
+        runaway = CustomerRegexRule.objects.create(
+            customer_name='Food Hall',
+            field_name='runaway',
+            regex_pattern=r'(a+)+$',
+        )
+        text = SAMPLE_TEXT + "\n" + "a" * 40 + "b"
+
+        result = PDFExtractionService().extract_data_using_regex(text, 'Food Hall')
+
+        self.assertEqual(result['invoice_no'], 'INV-001')
+        self.assertIsNone(result['runaway'])
+        self.assertEqual(
+            result['timed_out_rules'],
+            [{'rule_id': runaway.id, 'field_name': 'runaway', 'pattern': 'regex_pattern'}],
+        )
+        runaway.refresh_from_db()
+        self.assertEqual(runaway.timeout_count, 1)
+        self.assertIsNotNone(runaway.last_timeout_at)
+
+    def test_item_rows_stay_aligned_when_a_field_is_missing(self):
+        CustomerRegexRule.objects.create(
+            customer_name='Food Hall', field_name='sku', regex_pattern=r'^SKU (\d+)',
+            is_item_field=True, is_row_anchor=True,
+        )
+        CustomerRegexRule.objects.create(
+            customer_name='Food Hall', field_name='qty', regex_pattern=r'Qty: (\d+)',
+            regex_pattern_v2=r'Quantity (\d+)', is_item_field=True,
+        )
+        text = (
+            "SKU 100 Apples\nQty: 3\n"
+            "SKU 200 Pears\n"
+            "SKU 300 Plums\nQuantity 7\n"
+        )
+
+        items = PDFExtractionService().extract_item_data(text, 'Food Hall')
+
+        self.assertEqual(items, [
+            {'sku': '100', 'qty': '3'},
+            {'sku': '200', 'qty': None},
+            {'sku': '300', 'qty': '7'},
+        ])
+
+    def test_reprocess_extraction_queues_every_item_with_force(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            items = [self.create_item('a.pdf'), self.create_item('b.pdf')]
+
+        with mock.patch('pdf_extraction.tasks.process_pdf_item.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                queued = PDFExtractionService().reprocess_extraction(self.extraction.id)
+            # All items are dispatched by a single on_commit callback
+            dispatching = 0
+            for callback in callbacks:
+                dispatched = delay.call_count
+                callback()
+                dispatching += delay.call_count > dispatched
+
+        self.assertEqual(queued, 2)
+        self.assertEqual(dispatching, 1)
+        delay.assert_has_calls([mock.call(item.id, force=True) for item in items], any_order=True)
+
+
+    def test_page_policy_stops_parsing_once_the_header_is_complete(self):
+        get_text_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomerExtractionPolicy.objects.create(customer_name='Food Hall', stop_when_header_complete=True)
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item(content=build_pdf(['Invoice No: INV-9', 'Page 2 line', 'Page 3 line']))
+
+        with mock.patch('pdf_extraction.services.sample_rss') as sample_rss:
+            PDFExtractionService().process_item(item.id)
+
+        self.assertEqual(sample_rss.call_count, 1)
+        item.refresh_from_db()
+        self.assertEqual(item.result_data['invoice_no'], 'INV-9')
+        artifact = item.text_artifact
+        self.assertEqual((artifact.page_count, artifact.text), (1, 'Invoice No: INV-9\n'))
+        self.assertTrue(artifact.page_policy.startswith('header_complete='))
+
+        # Without the policy the stored partial text is not reused
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomerExtractionPolicy.objects.all().delete()
+        PDFExtractionService().process_item(item.id, force=True)
+        artifact.refresh_from_db()
+        self.assertEqual((artifact.page_count, artifact.page_policy), (3, ''))
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_backfill_recomputes_results_from_stored_text(self, extract_document):
+        service = PDFExtractionService()
+        with self.captureOnCommitCallbacks(execute=False):
+            items = [self.create_item(f'{index}.pdf', b'%PDF-1.4 ' + bytes([index])) for index in range(3)]
+        for item in items:
+            service.process_item(item.id)
+        CustomerRegexRule.objects.filter(field_name='invoice_no').update(regex_pattern=r'Total:\s*(\S+)')
+        regex_engine_rules.bump_rules_version()
+
+        progress = []
+        totals = run_backfill(customer_name='Food Hall', chunk_size=2, progress=progress.append)
+
+        self.assertEqual((totals['items'], totals['updated'], totals['chunks']), (3, 3, 2))
+        self.assertEqual([entry['last_id'] for entry in progress], [items[1].id, items[2].id])
+        for item in items:
+            item.refresh_from_db()
+            self.assertEqual(item.result_data['invoice_no'], '150.00')
+        self.assertEqual(extract_document.call_count, 3)
+        self.assertEqual(get_checkpoint(make_run_id('Food Hall', None, None)), 0)
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_backfill_resumes_after_its_checkpoint(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            first, second = self.create_item('a.pdf'), self.create_item('b.pdf')
+        set_checkpoint(make_run_id('Food Hall', None, None), first.id)
+
+        totals = run_backfill(customer_name='Food Hall', resume=True)
+
+        self.assertEqual(totals['items'], 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIsNone(first.result_data)
+        self.assertEqual(second.result_data['invoice_no'], 'INV-001')
+
+    @override_settings(PDF_RESULT_WRITE_BATCH_SIZE=1)
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_backfill_chunk_stopped_by_its_time_limit_queues_the_rest_again(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            items = [self.create_item(f'{index}.pdf', b'%PDF-1.4 ' + bytes([index])) for index in range(3)]
+        extract = PDFExtractionService.extract_data_using_regex
+
+        def stop_on_second_item(service, text, customer_name):
+            if extract_data.call_count == 2:
+                raise SoftTimeLimitExceeded()
+            return extract(service, text, customer_name)
+
+        with mock.patch.object(
+            PDFExtractionService, 'extract_data_using_regex', autospec=True, side_effect=stop_on_second_item
+        ) as extract_data, mock.patch('pdf_extraction.tasks.reextract_items_chunk.delay') as delay:
+            result = reextract_items_chunk([item.id for item in items])
+
+        self.assertEqual((result['updated'], result['requeued']), (1, 2))
+        delay.assert_called_once_with([items[1].id, items[2].id])
+        items[0].refresh_from_db()
+        self.assertEqual(items[0].result_data['invoice_no'], 'INV-001')
+
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_dry_run_reports_differences_without_writing(self, extract_document):
+        service = PDFExtractionService()
+        with self.captureOnCommitCallbacks(execute=False):
+            items = [self.create_item(f'{index}.pdf', b'%PDF-1.4 ' + bytes([index])) for index in range(4)]
+        for item in items:
+            service.process_item(item.id)
+        rules = rules_as_dicts('Food Hall')
+        rules[0]['regex_pattern'] = r'Total:\s*(\S+)'
+        rules.append({'field_name': 'sku', 'regex_pattern': r'(\d+)\.', 'is_item_field': True})
+
+        serial = dry_run_rules('Food Hall', rules, sample_size=3)
+        with mock.patch('pdf_extraction.dry_run.PARALLEL_MIN_DOCUMENTS', 1):
+            parallel = dry_run_rules('Food Hall', rules, sample_size=3, max_workers=2)
+
+        self.assertEqual(serial['results'], parallel['results'])
+        self.assertEqual((serial['documents'], serial['changed']), (3, 3))
+        self.assertEqual(serial['changed_fields'], {'invoice_no': 3, 'sku': 3})
+        self.assertEqual([result['item_id'] for result in serial['results']], [items[3].id, items[2].id, items[1].id])
+        self.assertEqual(
+            serial['results'][0]['fields'], [{'field': 'invoice_no', 'current': 'INV-001', 'candidate': '150.00'}]
+        )
+        self.assertEqual(serial['results'][0]['items'], [{'row': 0, 'field': 'sku', 'current': None, 'candidate': '150'}])
+        # Only stored text is used and stored results are left untouched
+        self.assertEqual(extract_document.call_count, 4)
+        items[3].refresh_from_db()
+        self.assertEqual(items[3].result_data['invoice_no'], 'INV-001')
+
+    @override_settings(REGEX_DRY_RUN_TIMEOUT=1)
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_runaway_candidate_pattern_is_stopped_at_the_dry_run_time_limit(self, extract_document):
+        with self.captureOnCommitCallbacks(execute=False):
+            item = self.create_item()
+        PDFExtractionService().process_item(item.id)
+        # Backtracks for minutes over the stored text
+        rules = [{'field_name': 'invoice_no', 'regex_pattern': r'(\w*\W?)*#'}]
+
+        with self.assertRaises(DryRunTimeout):
+            dry_run_rules('Food Hall', rules, sample_size=1)
+
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PDFExtractionAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content=b'%PDF-1.4 invoice'):
+        return SimpleUploadedFile(name, content, content_type='application/pdf')
+
+    def test_batch_creates_one_job_and_queues_every_file(self):
+        with mock.patch('pdf_extraction.tasks.process_pdf_item.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('pdf_extraction:extraction-batch'), {
+                    'customer_name': 'Food Hall',
+                    'pdf_files': [self.upload('a.pdf'), self.upload('b.pdf'), self.upload('c.pdf')],
+                }, format='multipart')
+
+        self.assertEqual(response.status_code, 202)
+        extraction = PDFExtraction.objects.get(id=response.data['job_id'])
+        items = list(extraction.pdf_items.order_by('id'))
+        self.assertEqual([item.pdf_file_name for item in items], ['a.pdf', 'b.pdf', 'c.pdf'])
+        self.assertTrue(all(item.pdf_file.storage.exists(item.pdf_file.name) for item in items))
+        self.assertTrue(all(item.status == PDFExtractionItem.STATUS_QUEUED for item in items))
+        delay.assert_has_calls([mock.call(item.id, force=False) for item in items])
+        self.assertEqual(delay.call_count, 3)
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_job_status_is_cached_until_the_next_transition(self, extract_document):
+        CustomerRegexRule.objects.create(
+            customer_name='Food Hall', field_name='invoice_no', regex_pattern=r'Invoice No:\s*(\S+)',
+        )
+        with mock.patch('pdf_extraction.tasks.process_pdf_item.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                extraction = PDFExtractionService().create_batch(
+                    'Food Hall', [self.upload('a.pdf'), self.upload('b.pdf')], created_by=self.user.get_username()
+                )
+        item = extraction.pdf_items.order_by('id').first()
+        status_url = reverse('pdf_extraction:extraction-status', args=[extraction.id])
+        results_url = reverse('pdf_extraction:extraction-results', args=[extraction.id])
+
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counts']['queued'], 2)
+        self.assertFalse(response.data['complete'])
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(status_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Only the savepoint of the request transaction, the status comes from the cache
+        self.assertFalse([query for query in queries.captured_queries if 'SELECT' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PDFExtractionService().process_item(item.id)
+        response = self.client.get(status_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counts']['done'], 1)
+        self.assertEqual(response.data['progress'], 0.5)
+        self.assertIsNotNone(response.data['items'][0]['processing_seconds'])
+
+        response = self.client.get(results_url)
+        self.assertEqual(response.data['results'][0]['result_data']['invoice_no'], 'INV-001')
+        self.assertIsNone(response.data['results'][1]['result_data'])
+        self.assertEqual(self.client.get(results_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(reverse('pdf_extraction:extraction-status', args=[0])).status_code, 404)
+
+    @mock.patch.object(PDFExtractionService, 'extract_document', return_value=SAMPLE_DOCUMENT)
+    def test_results_etag_changes_when_only_the_results_are_rewritten(self, extract_document):
+        CustomerRegexRule.objects.create(
+            customer_name='Food Hall', field_name='invoice_no', regex_pattern=r'Invoice No:\s*(\S+)',
+        )
+        with mock.patch('pdf_extraction.tasks.process_pdf_item.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                extraction = PDFExtractionService().create_batch(
+                    'Food Hall', [self.upload('a.pdf')], created_by=self.user.get_username()
+                )
+        item = extraction.pdf_items.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            PDFExtractionService().process_item(item.id)
+        results_url = reverse('pdf_extraction:extraction-results', args=[extraction.id])
+        etag = self.client.get(results_url)['ETag']
+
+        CustomerRegexRule.objects.filter(field_name='invoice_no').update(regex_pattern=r'Total:\s*(\S+)')
+        regex_engine_rules.bump_rules_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            reextract_items([item.id])
+
+        response = self.client.get(results_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['result_data']['invoice_no'], '150.00')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_jobs_leave_nothing_in_the_cache(self):
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add, \
+                mock.patch.object(cache, 'set', wraps=cache.set) as set_:
+            self.assertIsNone(get_job_status(987654))
+
+        add.assert_not_called()
+        set_.assert_not_called()
+
+    def test_jobs_are_only_visible_to_their_creator_and_staff(self):
+        with mock.patch('pdf_extraction.tasks.process_pdf_item.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                extraction = PDFExtractionService().create_batch(
+                    'Food Hall', [self.upload('a.pdf')], created_by=self.user.get_username()
+                )
+        urls = [
+            reverse('pdf_extraction:extraction-status', args=[extraction.id]),
+            reverse('pdf_extraction:extraction-results', args=[extraction.id]),
+        ]
+
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_authenticate(UserFactory())
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(UserFactory(is_staff=True))
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_batch_rejects_non_pdf_files(self):
+        response = self.client.post(reverse('pdf_extraction:extraction-batch'), {
+            'customer_name': 'Food Hall',
+            'pdf_files': [self.upload('a.pdf'), self.upload('notes.txt')],
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pdf_files', response.data)
+        self.assertFalse(PDFExtraction.objects.exists())
+
+    def test_async_extract_text_parses_on_the_executor(self):
+        executor = BoundedExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        with mock.patch('pdf_extraction.views.get_extraction_executor', return_value=executor):
+            response = self.client.post(reverse('pdf_extraction:extract-text-async'), {
+                'pdf_file': self.upload('invoice.pdf', build_pdf(['Invoice No: INV-001'])),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), 'Invoice No: INV-001\n')
+        self.assertIn('invoice_extracted.txt', response['Content-Disposition'])
+        self.assertEqual(executor.in_flight, 0)
+
+    def test_async_extract_text_streams_and_negotiates_like_the_api_view(self):
+        executor = BoundedExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        content = build_pdf(['Invoice No: INV-001', 'Page 2 line'])
+
+        async def post(accept='*/*', **data):
+            response = await self.async_client.post(
+                reverse('pdf_extraction:extract-text-async'),
+                dict(data, pdf_file=self.upload('invoice.pdf', content)),
+                headers={'Accept': accept},
+            )
+            self.assertTrue(response.streaming)
+            return response, b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        with mock.patch('pdf_extraction.views.get_extraction_executor', return_value=executor):
+            response, text = async_to_sync(post)(stream='true', page_markers='true')
+            self.assertEqual(text, '--- Page 1 ---\nInvoice No: INV-001\n--- Page 2 ---\nPage 2 line\n')
+            self.assertIn('invoice_extracted.txt', response['Content-Disposition'])
+
+            response, text = async_to_sync(post)('application/x-ndjson', pages='2')
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+            lines = [json.loads(line) for line in text.splitlines()]
+            self.assertEqual([line['type'] for line in lines], ['page', 'summary'])
+            self.assertEqual((lines[0]['page'], lines[0]['text']), (2, 'Page 2 line'))
+
+        self.assertEqual(executor.in_flight, 0)
+
+    @override_settings(PDF_ASYNC_EXTRACT_RETRY_AFTER=7)
+    def test_async_extract_text_is_rejected_when_the_executor_is_saturated(self):
+        executor = BoundedExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        async def occupy():
+            executor.submit(release.wait)
+
+        async_to_sync(occupy)()
+
+        with mock.patch('pdf_extraction.views.get_extraction_executor', return_value=executor):
+            response = self.client.post(reverse('pdf_extraction:extract-text-async'), {
+                'pdf_file': self.upload('invoice.pdf'),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+    def test_cancelled_queued_extraction_releases_its_slot(self):
+        executor = BoundedExecutor(max_workers=1, max_queued=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        queued_ran = threading.Event()
+
+        async def cancel_queued():
+            running = executor.submit(release.wait)
+            queued = executor.submit(queued_ran.set)
+            # As when Django cancels the view task of a disconnected client
+            queued.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            await running
+
+        async_to_sync(cancel_queued)()
+
+        self.assertFalse(queued_ran.is_set())
+        self.assertEqual(executor.in_flight, 0)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PDF_PROGRESS_REDIS_URL='redis://progress')
+class ProgressEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.extraction = PDFExtraction.objects.create(customer_name='Food Hall')
+
+    def test_pages_are_reported_inside_a_progress_scope(self):
+        pages = [(1, 'one'), (2, 'two')]
+        with mock.patch('pdf_extraction.progress.publish_progress') as publish:
+            self.assertEqual(list(report_pages(pages, 2)), pages)
+            publish.assert_not_called()
+
+            with progress_scope(self.extraction.id, 7):
+                list(report_pages(pages, 2))
+
+        publish.assert_has_calls([
+            mock.call(self.extraction.id, {'type': 'page', 'item_id': 7, 'page': 1, 'page_count': 2}),
+            mock.call(self.extraction.id, {'type': 'page', 'item_id': 7, 'page': 2, 'page_count': 2}),
+        ])
+
+    def test_websocket_subscribers_receive_the_status_then_published_events(self):
+        token = Token.objects.create(user=UserFactory())
+        PDFExtraction.objects.filter(id=self.extraction.id).update(created_by=token.user.get_username())
+        hub = ProgressHub('redis://progress')
+
+        async def connect(self):
+            self._pubsub = mock.AsyncMock()
+
+        async def read(self):
+            await asyncio.Event().wait()
+
+        async def session():
+            inbox = asyncio.Queue()
+            outbox = asyncio.Queue()
+            scope = {'type': 'websocket', 'query_string': f'token={token.key}'.encode(), 'headers': []}
+            app = asyncio.create_task(websocket_application(scope, inbox.get, outbox.put))
+
+            await inbox.put({'type': 'websocket.connect'})
+            accepted = await outbox.get()
+            await inbox.put({'type': 'websocket.receive', 'text': json.dumps({'action': 'subscribe', 'job_id': self.extraction.id})})
+            status = json.loads((await outbox.get())['text'])
+            hub.dispatch(
+                f'pdf_extraction:progress:{self.extraction.id}'.encode(),
+                json.dumps({'type': 'page', 'page': 1}).encode(),
+            )
+            event = json.loads((await outbox.get())['text'])
+            await inbox.put({'type': 'websocket.disconnect'})
+            await app
+            return accepted, status, event
+
+        with mock.patch.object(ProgressHub, '_connect', connect), mock.patch.object(ProgressHub, '_read', read), \
+                mock.patch('pdf_extraction.progress.get_progress_hub', return_value=hub):
+            accepted, status, event = async_to_sync(session)()
+
+        self.assertEqual(accepted, {'type': 'websocket.accept'})
+        self.assertEqual((status['type'], status['status']['total']), ('status', 0))
+        self.assertEqual(event, {'type': 'page', 'page': 1})
+        self.assertEqual(hub.subscriber_count(), 0)
+
+    def test_websocket_subscriptions_are_limited_to_the_users_jobs(self):
+        token = Token.objects.create(user=UserFactory())
+        hub = mock.Mock()
+
+        async def session():
+            sent = []
+            events = iter([
+                {'type': 'websocket.connect'},
+                {'type': 'websocket.receive', 'text': json.dumps({'action': 'subscribe', 'job_id': self.extraction.id})},
+                {'type': 'websocket.disconnect'},
+            ])
+
+            async def receive():
+                return next(events)
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'websocket', 'query_string': f'token={token.key}'.encode(), 'headers': []}
+            await websocket_application(scope, receive, send)
+            return sent
+
+        with mock.patch('pdf_extraction.progress.get_progress_hub', return_value=hub):
+            accepted, error = async_to_sync(session)()
+
+        self.assertEqual(accepted, {'type': 'websocket.accept'})
+        self.assertEqual(
+            json.loads(error['text']),
+            {'type': 'error', 'job_id': self.extraction.id, 'error': 'Extraction job not found'},
+        )
+        hub.subscribe.assert_not_called()
+
+    def test_websocket_rejects_unauthenticated_connections(self):
+        async def session():
+            sent = []
+            events = iter([{'type': 'websocket.connect'}])
+
+            async def receive():
+                return next(events)
+
+            async def send(message):
+                sent.append(message)
+
+            await websocket_application({'type': 'websocket', 'query_string': b'', 'headers': []}, receive, send)
+            return sent
+
+        self.assertEqual(async_to_sync(session)(), [{'type': 'websocket.close', 'code': 4401}])
+
+    @override_settings(ALLOWED_HOSTS=['app.example.com'], CSRF_TRUSTED_ORIGINS=['https://*.partner.example'])
+    def test_websocket_session_is_only_used_from_allowed_origins(self):
+        self.client.force_login(UserFactory())
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        async def handshake(origin):
+            sent = []
+            events = iter([{'type': 'websocket.connect'}, {'type': 'websocket.disconnect'}])
+
+            async def receive():
+                return next(events)
+
+            async def send(message):
+                sent.append(message)
+
+            headers = [(b'cookie', cookie.encode())]
+            if origin:
+                headers.append((b'origin', origin.encode()))
+            await websocket_application({'type': 'websocket', 'query_string': b'', 'headers': headers}, receive, send)
+            return sent[0]
+
+        accepted, rejected = {'type': 'websocket.accept'}, {'type': 'websocket.close', 'code': 4401}
+        self.assertEqual(async_to_sync(handshake)('https://app.example.com'), accepted)
+        self.assertEqual(async_to_sync(handshake)('https://eu.partner.example'), accepted)
+        self.assertEqual(async_to_sync(handshake)('https://evil.example'), rejected)
+        self.assertEqual(async_to_sync(handshake)(None), rejected)
+
+class ExtractedTextCacheTests(TestCase):
+    def make_cache(self, max_bytes=1024):
+        return ExtractedTextCache(max_bytes=max_bytes, cache_alias='default', timeout=60, version=1)
+
+    def tearDown(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def test_memory_tier_evicts_least_recently_used_by_size(self):
+        text_cache = self.make_cache(max_bytes=10)
+        text_cache.set('a', {'text': 'aaaa', 'page_offsets': []})
+        text_cache.set('b', {'text': 'bbbb', 'page_offsets': []})
+        text_cache.get('a')
+        text_cache.set('c', {'text': 'cccc', 'page_offsets': []})
+
+        stats = text_cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['size_bytes'], 8)
+        self.assertEqual(stats['evictions'], 1)
+
+        # 'b' was evicted locally but is still served by the shared tier
+        self.assertEqual(text_cache.get('b')['text'], 'bbbb')
+        self.assertEqual(text_cache.stats()['shared_hits'], 1)
+
+    def test_counters_track_hits_and_misses(self):
+        text_cache = self.make_cache()
+        self.assertIsNone(text_cache.get('missing'))
+        text_cache.set('doc', {'text': 'text', 'page_offsets': []})
+        self.assertEqual(text_cache.get('doc')['text'], 'text')
+
+        stats = text_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['lookups'], 2)
+
+    def test_extraction_version_is_part_of_the_key(self):
+        old_cache = self.make_cache()
+        old_cache.set('doc', {'text': 'old text', 'page_offsets': []})
+        new_cache = ExtractedTextCache(max_bytes=1024, cache_alias='default', timeout=60, version=2)
+
+        self.assertIsNone(new_cache.get('doc'))
+
+    def test_identical_pdfs_are_parsed_once(self):
+        text_cache = self.make_cache()
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as pdf:
+            pdf.write(b'%PDF-1.4 same bytes')
+            pdf.flush()
+
+            with mock.patch('pdf_extraction.services.get_text_cache', return_value=text_cache), \
+                    mock.patch.object(PDFExtractionService, '_parse_pdf_document',
+                                      return_value={'text': 'page one\n', 'page_offsets': [[1, 0, 8]]}) as parse:
+                first = PDFExtractionService.extract_text_from_pdf(pdf.name, 'regex')
+                second = PDFExtractionService.extract_text_from_pdf(pdf.name, 'regex')
+
+        self.assertEqual(first, 'page one')
+        self.assertEqual(second, 'page one')
+        parse.assert_called_once()
+
+
+class PDFTextExtractionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_text_cache().clear()
+        self.pdf = tempfile.NamedTemporaryFile(suffix='.pdf')
+        self.pdf.write(build_pdf([f'Page {number} line' if number != 3 else '' for number in range(1, 8)]))
+        self.pdf.flush()
+
+    def tearDown(self):
+        self.pdf.close()
+
+    @override_settings(PDF_PARALLEL_MAX_WORKERS=3)
+    def test_parallel_output_is_identical_to_serial(self):
+        serial = PDFExtractionService._parse_pdf_document(self.pdf.name, parallel=False)
+        parallel = PDFExtractionService._parse_pdf_document(self.pdf.name, parallel=True)
+
+        self.assertEqual(parallel, serial)
+        self.assertEqual(serial['page_offsets'][2], [3, 24, 24])
+        self.assertTrue(serial['text'].startswith('Page 1 line\nPage 2 line\nPage 4 line\n'))
+
+    def test_parallel_parsing_works_inside_a_daemonic_worker_process(self):
+        context = billiard.get_context('fork')
+        results = context.Queue()
+        child = context.Process(target=parse_pages_in_worker_child, args=(self.pdf.name, 7, results), daemon=True)
+        child.start()
+        pages = results.get(timeout=30)
+        child.join()
+
+        self.assertEqual(pages, list(PDFExtractionService.iter_pages(self.pdf.name)))
+
+    @override_settings(PDF_PARALLEL_MAX_WORKERS=2, PDF_PARALLEL_PAGE_THRESHOLD=5)
+    def test_parallel_mode_kicks_in_above_threshold(self):
+        with mock.patch('pdf_extraction.services._extract_page_texts_parallel', return_value=[]) as parallel:
+            PDFExtractionService._parse_pdf_document(self.pdf.name)
+        parallel.assert_called_once_with(self.pdf.name, 7, 2)
+
+    def test_iter_pages_yields_pages_lazily(self):
+        pages = PDFExtractionService.iter_pages(self.pdf.name)
+
+        self.assertEqual(next(pages), (1, 'Page 1 line'))
+        self.assertEqual(next(pages), (2, 'Page 2 line'))
+        self.assertEqual(next(pages), (3, ''))
+        pages.close()
+
+    def test_string_api_joins_streamed_pages(self):
+        expected = join_page_texts(PDFExtractionService.iter_pages(self.pdf.name))
+
+        self.assertEqual(PDFExtractionService._parse_pdf_document(self.pdf.name, parallel=False)['text'], expected)
+        self.assertEqual(expected.count('\n'), 6)
+
+    def test_streamed_text_matches_the_buffered_download(self):
+        url = reverse('pdf_extraction:extract-text')
+
+        def post(**options):
+            with open(self.pdf.name, 'rb') as pdf_file:
+                return self.client.post(url, dict(options, pdf_file=pdf_file))
+
+        streamed = post(stream='true')
+        self.assertTrue(streamed.streaming)
+        buffered = post()
+        self.assertFalse(buffered.streaming)
+        # The buffered request cached the document, now the stream is replayed from the cache
+        replayed = post(stream='true', page_markers='true')
+
+        self.assertEqual(b''.join(streamed.streaming_content), buffered.content)
+        self.assertEqual(streamed['Content-Disposition'], buffered['Content-Disposition'])
+        self.assertEqual(
+            b''.join(replayed.streaming_content).decode().split('\n')[:6],
+            ['--- Page 1 ---', 'Page 1 line', '--- Page 2 ---', 'Page 2 line', '--- Page 3 ---', '--- Page 4 ---'],
+        )
+
+    def test_streamed_upload_is_released_on_every_path(self):
+        released = []
+
+        def upload_pages(uploaded_file, pages=None):
+            try:
+                yield 1, ''
+                yield 2, 'Page 2 line' if pages is None else ''
+            finally:
+                released.append(pages)
+
+        def post(**options):
+            with open(self.pdf.name, 'rb') as pdf_file:
+                return self.client.post(reverse('pdf_extraction:extract-text'), dict(options, pdf_file=pdf_file))
+
+        with mock.patch.object(PDFExtractionService, 'iter_upload_pages', side_effect=upload_pages):
+            self.assertEqual(post(stream='true', pages='1-2').status_code, 400)
+            self.assertEqual(released, ['1-2'])
+
+            # The client goes away before reading the first chunk
+            response = post(stream='true')
+            self.assertTrue(response.streaming)
+            response.close()
+            self.assertEqual(released, ['1-2', None])
+
+    def test_streamed_pages_are_parsed_as_they_are_sent(self):
+        with open(self.pdf.name, 'rb') as pdf_file:
+            upload = SimpleUploadedFile('invoice.pdf', pdf_file.read())
+        chunks = iter_page_chunks(PDFExtractionService.iter_upload_pages(upload))
+
+        with mock.patch('pdf_extraction.services.sample_rss') as sample_rss:
+            self.assertEqual(next(chunks), 'Page 1 line\n')
+            self.assertEqual(sample_rss.call_count, 1)
+            chunks.close()
+
+    def test_uploads_are_parsed_where_django_holds_them(self):
+        url = reverse('pdf_extraction:extract-text')
+        # Small uploads stay in memory, with a limit of 0 every upload is spooled to disk
+        for max_memory_size, source_type in ((2621440, io.BytesIO), (0, str)):
+            cache.clear()
+            get_text_cache().clear()
+            with (
+                self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=max_memory_size),
+                mock.patch.object(PDFExtractionService, 'spool_upload', side_effect=AssertionError) as spool_upload,
+                mock.patch.object(
+                    PDFExtractionService, '_parse_pdf_document', wraps=PDFExtractionService._parse_pdf_document
+                ) as parse,
+                open(self.pdf.name, 'rb') as pdf_file,
+            ):
+                response = self.client.post(url, {'pdf_file': pdf_file})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.content.startswith(b'Page 1 line\n'))
+            spool_upload.assert_not_called()
+            self.assertIsInstance(parse.call_args.args[0], source_type)
+
+    def test_page_selector_limits_the_pages_parsed(self):
+        self.assertEqual(parse_page_selector('1-3, -1'), [(1, 3), (-1, -1)])
+        self.assertEqual(select_pages(parse_page_selector('1-3,-1,2'), 7), [1, 2, 3, 7])
+        self.assertEqual(select_pages(parse_page_selector('-2--1,9'), 7, max_pages=6), [6])
+        for selector in ('0', '1-', 'a', '1,,2'):
+            with self.assertRaises(ValueError):
+                parse_page_selector(selector)
+
+        with mock.patch('pdf_extraction.services.sample_rss') as sample_rss:
+            text = PDFExtractionService.extract_text_from_pdf(self.pdf.name, 'regex', pages='1,-1')
+        self.assertEqual(text, 'Page 1 line\nPage 7 line')
+        self.assertEqual(sample_rss.call_count, 2)
+
+        # Once the whole document is cached, selections are cut from it
+        PDFExtractionService.extract_raw_text(self.pdf.name)
+        with mock.patch.object(PDFExtractionService, '_parse_pdf_document') as parse:
+            self.assertEqual(PDFExtractionService.extract_raw_text(self.pdf.name, pages='2-4'), 'Page 2 line\nPage 4 line\n')
+        parse.assert_not_called()
+
+    def test_extract_text_accepts_a_page_selector(self):
+        url = reverse('pdf_extraction:extract-text')
+        with open(self.pdf.name, 'rb') as pdf_file:
+            response = self.client.post(url, {'pdf_file': pdf_file, 'pages': '-1'})
+        self.assertEqual(response.content, b'Page 7 line\n')
+
+        with open(self.pdf.name, 'rb') as pdf_file:
+            response = self.client.post(url, {'pdf_file': pdf_file, 'pages': '2-x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pages', response.json())
+
+    def test_pages_are_negotiated_as_json_or_ndjson(self):
+        url = reverse('pdf_extraction:extract-text')
+
+        def post(accept, **data):
+            with open(self.pdf.name, 'rb') as pdf_file:
+                return self.client.post(url, dict(data, pdf_file=pdf_file), HTTP_ACCEPT=accept)
+
+        text = post('*/*').content.decode()
+        response = post('application/json')
+        self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+        self.assertTrue(response.streaming)
+        document = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((document['page_count'], document['character_count']), (7, len(text)))
+        self.assertEqual([page['page'] for page in document['pages']], list(range(1, 8)))
+        for page in document['pages']:
+            self.assertEqual(text[page['start']:page['end']], page['text'])
+            self.assertGreaterEqual(page['seconds'], 0)
+
+        response = post('application/x-ndjson', pages='2-3')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['type'] for line in lines], ['page', 'page', 'summary'])
+        self.assertEqual((lines[0]['text'], lines[0]['start'], lines[0]['end']), ('Page 2 line', 0, 11))
+        self.assertEqual((lines[1]['start'], lines[1]['end']), (12, 12))
+        self.assertEqual((lines[2]['page_count'], lines[2]['character_count']), (2, 12))
+
+        response = post('application/x-ndjson', pages='x')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pages', response.json())
+
+    def test_page_caches_are_released_and_rss_sampled(self):
+        from pdfplumber.page import Page
+
+        with mock.patch.object(Page, 'close', autospec=True) as close, track_peak_rss() as tracker:
+            pages = PDFExtractionService.iter_pages(self.pdf.name)
+            next(pages)
+            self.assertEqual(close.call_count, 1)
+            next(pages)
+            self.assertEqual(close.call_count, 2)
+            pages.close()
 
-# Create your tests here.
+        self.assertGreaterEqual(tracker.peak_bytes, tracker.start_bytes)
@@ -1,8 +1,15 @@
 from django.urls import path
-from .views import PDFTextExtractionView
+from .views import AsyncPDFTextExtractionView, ExtractionResultsView, ExtractionStatusView
+from .views import PDFBatchExtractionView, PDFTextExtractionView, RuleDryRunView, TextCacheStatsView
 
 app_name = "pdf_extraction"
 
 urlpatterns = [
     path('extract-text/', PDFTextExtractionView.as_view(), name='extract-text'),
+    path('extract-text/async/', AsyncPDFTextExtractionView.as_view(), name='extract-text-async'),
+    path('extractions/', PDFBatchExtractionView.as_view(), name='extraction-batch'),
+    path('extractions/<int:job_id>/', ExtractionStatusView.as_view(), name='extraction-status'),
+    path('extractions/<int:job_id>/results/', ExtractionResultsView.as_view(), name='extraction-results'),
+    path('text-cache/stats/', TextCacheStatsView.as_view(), name='text-cache-stats'),
+    path('rules/dry-run/', RuleDryRunView.as_view(), name='rule-dry-run'),
 ]
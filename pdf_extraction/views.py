@@ -1,18 +1,33 @@
+import itertools
 import logging
-import tempfile
 import os
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.permissions import AllowAny
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from drf_spectacular.utils import extend_schema
 from drf_spectacular.types import OpenApiTypes
 
-import pdfplumber
-
-from .serializers import PDFTextExtractionSerializer, PDFTextExtractionResponseSerializer
+from .cache import get_text_cache
+from .dry_run import DryRunTimeout, dry_run_rules, rules_as_dicts
+from .executor import ExecutorSaturated, get_extraction_executor
+from .jobs import build_results_document, can_view_job, get_job_status
+from .models import PDFExtractionItem
+from .serializers import PDFTextExtractionSerializer, PDFTextExtractionResponseSerializer, TextCacheStatsSerializer
+from .serializers import PDFBatchExtractionSerializer, PDFBatchExtractionResponseSerializer
+from .serializers import ExtractionStatusSerializer, ExtractionResultsSerializer
+from .serializers import RuleDryRunSerializer, RuleDryRunResponseSerializer
+from .services import PDFExtractionService, iter_page_chunks
+from .streaming import JSON, MEDIA_TYPES, NDJSON, TEXT, ClosingIterator, iter_json_document, iter_ndjson
+from .streaming import iter_page_records
 
 logger = logging.getLogger(__name__)
 
@@ -21,15 +36,28 @@ class PDFTextExtractionView(APIView):
     """
     API endpoint to extract text from PDF files using pdfplumber
     No authentication required
-    Returns a downloadable .txt file with raw extracted text
+    Returns a downloadable .txt file with raw extracted text, or per-page text with
+    offsets and timings for Accept: application/json or application/x-ndjson
     """
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [AllowAny]  # No authentication required
 
+    def perform_content_negotiation(self, request, force=False):
+        # The view produces text and NDJSON itself, so other Accept headers are not refused here
+        return super().perform_content_negotiation(request, force=True)
+
     @extend_schema(
         request=PDFTextExtractionSerializer,
-        responses={200: PDFTextExtractionResponseSerializer},
-        description="Upload a PDF file and download extracted text as .txt file",
+        responses={
+            (200, TEXT): OpenApiTypes.STR,
+            (200, JSON): PDFTextExtractionResponseSerializer,
+            (200, NDJSON): OpenApiTypes.STR,
+        },
+        description=(
+            "Upload a PDF file and download extracted text as .txt file, optionally streamed page by page. "
+            "With Accept: application/json the pages are returned as a streamed JSON document, with "
+            "application/x-ndjson as one JSON line per page followed by a summary line."
+        ),
         tags=["PDF Extraction"]
     )
     def post(self, request, *args, **kwargs):
@@ -42,7 +70,183 @@ class PDFTextExtractionView(APIView):
         Returns:
             HttpResponse with text/plain content for download
         """
-        serializer = PDFTextExtractionSerializer(data=request.data)
+        return _extract_text_response(request.data, request.get_preferred_type(MEDIA_TYPES) or TEXT)
+
+
+def _extract_text_response(data, media_type=TEXT, error_response=Response):
+    """
+    Validate an extract-text upload and respond with its text, for both extract-text views
+
+    Text is downloaded as a whole unless the stream option is set, JSON and NDJSON are
+    always streamed. Errors are built with ``error_response``, which is DRF's Response for
+    the API view and JsonResponse for the async one.
+    """
+    serializer = PDFTextExtractionSerializer(data=data)
+    if not serializer.is_valid():
+        return error_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    pdf_file = serializer.validated_data['pdf_file']
+
+    # Get original filename without extension
+    original_filename = os.path.splitext(pdf_file.name)[0]
+
+    pages = serializer.validated_data.get('pages') or None
+
+    if serializer.validated_data['stream'] or media_type != TEXT:
+        return _stream_pages(
+            pdf_file, original_filename, serializer.validated_data['page_markers'], pages, media_type,
+            error_response,
+        )
+
+    try:
+        extracted_text = PDFExtractionService.extract_upload_text(pdf_file, pages=pages)
+
+        if not extracted_text.strip():
+            logger.warning("No text could be extracted from the PDF")
+            return error_response(
+                {"error": "No text could be extracted from the PDF"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        logger.info(f"Successfully extracted {len(extracted_text)} characters from PDF")
+
+        response = HttpResponse(extracted_text, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{original_filename}_extracted.txt"'
+        patch_vary_headers(response, ('Accept',))
+
+        return response
+
+    except Exception as e:
+        logger.error(f"Error extracting text from PDF: {str(e)}")
+        return error_response(
+            {"error": f"Error processing PDF: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _stream_pages(pdf_file, original_filename, page_markers, selector=None, media_type=TEXT, error_response=Response):
+    """
+    Respond with each page as soon as pdfplumber produces it, as text, JSON or NDJSON
+
+    The document is parsed up to its first page with text before responding, so
+    documents without text and unreadable files still get an error status. The parser
+    and the upload it reads are released on every path, also when the client leaves
+    before the first chunk.
+    """
+    pages = PDFExtractionService.iter_upload_pages(pdf_file, pages=selector)
+    records = iter_page_records(pages)
+    leading = []
+    try:
+        for record in records:
+            leading.append(record)
+            if record['text'].strip():
+                break
+        else:
+            pages.close()
+            logger.warning("No text could be extracted from the PDF")
+            return error_response(
+                {"error": "No text could be extracted from the PDF"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    except Exception as e:
+        pages.close()
+        logger.error(f"Error extracting text from PDF: {str(e)}")
+        return error_response(
+            {"error": f"Error processing PDF: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    records = itertools.chain(leading, records)
+    if media_type == JSON:
+        content = iter_json_document(records)
+    elif media_type == NDJSON:
+        content = iter_ndjson(records)
+    else:
+        content = iter_page_chunks(
+            ((record['page'], record['text']) for record in records), page_markers=page_markers
+        )
+
+    def stream():
+        try:
+            yield from content
+        except Exception as e:
+            # The status line is already sent, the client sees a truncated download
+            logger.error(f"Error streaming text from PDF: {str(e)}")
+            raise
+
+    response = StreamingHttpResponse(
+        ClosingIterator(stream(), pages.close), content_type=f'{media_type}; charset=utf-8'
+    )
+    if media_type == TEXT:
+        response['Content-Disposition'] = f'attachment; filename="{original_filename}_extracted.txt"'
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+class AsyncPDFTextExtractionView(View):
+    """
+    ASGI-native variant of the extract-text endpoint
+    No authentication required
+    Returns the same responses as PDFTextExtractionView
+
+    The upload is received by the ASGI server without holding a thread, then parsing it
+    runs on the bounded extraction executor. When that has no free slot the request is
+    answered 503 with a Retry-After header straight away instead of waiting in line.
+    The pages of a streamed response are parsed on the executor's threads as well, while
+    the client reads them.
+    """
+    http_method_names = ['post', 'options']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # An API endpoint like the DRF views, and async views cannot run in ATOMIC_REQUESTS
+        return transaction.non_atomic_requests(csrf_exempt(super().as_view(**initkwargs)))
+
+    async def post(self, request, *args, **kwargs):
+        executor = get_extraction_executor()
+        media_type = request.get_preferred_type(MEDIA_TYPES) or TEXT
+
+        def extract():
+            # Read in the worker, multipart parsing blocks as well
+            data = request.POST.copy()
+            data.update(request.FILES)
+            return _extract_text_response(data, media_type, error_response=JsonResponse)
+
+        try:
+            future = executor.submit(extract)
+        except ExecutorSaturated as e:
+            logger.warning(f"Rejected PDF text extraction: {str(e)}")
+            response = JsonResponse(
+                {"error": "Too many PDF extractions in progress, retry later"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response['Retry-After'] = str(settings.PDF_ASYNC_EXTRACT_RETRY_AFTER)
+            return response
+
+        response = await future
+        if response.streaming:
+            # Served as is, the content would be read into memory by a single thread
+            response.streaming_content = executor.iterate(response.streaming_content)
+        return response
+
+
+class PDFBatchExtractionView(APIView):
+    """
+    API endpoint creating a regex extraction job for many PDF files at once
+    Authentication required
+    Returns the job id immediately, the files are processed by the Celery workers
+    """
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=PDFBatchExtractionSerializer,
+        responses={202: PDFBatchExtractionResponseSerializer},
+        description="Upload many PDF files for one customer and queue their regex extraction",
+        tags=["PDF Extraction"]
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = PDFBatchExtractionSerializer(data=request.data)
 
         if not serializer.is_valid():
             return Response(
@@ -50,63 +254,135 @@ class PDFTextExtractionView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        pdf_file = serializer.validated_data['pdf_file']
+        pdf_files = serializer.validated_data['pdf_files']
+        extraction = PDFExtractionService().create_batch(
+            serializer.validated_data['customer_name'],
+            pdf_files,
+            customer_id=serializer.validated_data.get('customer_id') or None,
+            created_by=request.user.get_username(),
+        )
 
-        # Get original filename without extension
-        original_filename = os.path.splitext(pdf_file.name)[0]
+        return Response(
+            {'job_id': extraction.id, 'item_count': len(pdf_files), 'status': PDFExtractionItem.STATUS_QUEUED},
+            status=status.HTTP_202_ACCEPTED
+        )
 
-        # Create a temporary file to save the uploaded PDF
-        temp_file = None
-        try:
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                for chunk in pdf_file.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
 
-            # Extract text from PDF
-            extracted_text = ""
-            page_count = 0
+class ExtractionJobView(APIView):
+    """Base for job endpoints answering conditional GETs from the cached status document"""
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def not_modified(request, etag):
+        if_none_match = request.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+
+    def conditional_response(self, request, etag, build):
+        if self.not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(build())
+        response['ETag'] = etag
+        return response
 
-            with pdfplumber.open(temp_file_path) as pdf:
-                page_count = len(pdf.pages)
 
-                for page_num, page in enumerate(pdf.pages, start=1):
-                    logger.debug(f"Processing page {page_num} of {page_count}")
-                    page_text = page.extract_text()
+class ExtractionStatusView(ExtractionJobView):
+    """
+    API endpoint reporting per-item state, progress counts and timings of an extraction job
+    Authentication required, only staff and the creator of the job see it
+    Supports If-None-Match, unchanged jobs are answered with 304 from the cache
+    """
 
-                    if page_text:
-                        # Add raw text as-is from pdfplumber
-                        extracted_text += page_text + "\n"
-                    else:
-                        logger.warning(f"No text found on page {page_num}")
+    @extend_schema(
+        responses={200: ExtractionStatusSerializer, 304: None},
+        description="Status and progress of an extraction job",
+        tags=["PDF Extraction"]
+    )
+    def get(self, request, job_id, *args, **kwargs):
+        job_status = get_job_status(job_id) if can_view_job(request.user, job_id) else None
+        if job_status is None:
+            return Response({"error": "Extraction job not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            if not extracted_text.strip():
-                logger.warning(f"No text could be extracted from the PDF")
-                return Response(
-                    {"error": "No text could be extracted from the PDF"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        etag, document = job_status
+        return self.conditional_response(request, etag, lambda: document)
 
-            logger.info(f"Successfully extracted {len(extracted_text)} characters from PDF with {page_count} pages")
 
-            response = HttpResponse(extracted_text, content_type='text/plain; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{original_filename}_extracted.txt"'
+class ExtractionResultsView(ExtractionJobView):
+    """
+    API endpoint returning the result_data of every item of an extraction job
+    Authentication required, only staff and the creator of the job see it
+    Supports If-None-Match, unchanged jobs are answered with 304 without loading results
+    """
 
-            return response
+    @extend_schema(
+        responses={200: ExtractionResultsSerializer, 304: None},
+        description="Extracted data of every item of an extraction job",
+        tags=["PDF Extraction"]
+    )
+    def get(self, request, job_id, *args, **kwargs):
+        job_status = get_job_status(job_id) if can_view_job(request.user, job_id) else None
+        if job_status is None:
+            return Response({"error": "Extraction job not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        except Exception as e:
-            logger.error(f"Error extracting text from PDF: {str(e)}")
+        etag, document = job_status
+        # Every result write stamps updated_at, which is part of the status document
+        results_etag = f'{etag[:-1]}-results"'
+        return self.conditional_response(
+            request, results_etag, lambda: dict(build_results_document(job_id), complete=document['complete'])
+        )
+
+
+class TextCacheStatsView(APIView):
+    """
+    API endpoint exposing the extracted text cache counters of the serving process
+    Admin users only
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        responses={200: TextCacheStatsSerializer},
+        description="Hit/miss counters and size of the extracted text cache",
+        tags=["PDF Extraction"]
+    )
+    def get(self, request, *args, **kwargs):
+        return Response(get_text_cache().stats())
+
+
+class RuleDryRunView(APIView):
+    """
+    API endpoint evaluating a candidate regex rule set against the latest stored documents
+    of a customer, without parsing PDFs or writing results
+    Admin users only
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        request=RuleDryRunSerializer,
+        responses={200: RuleDryRunResponseSerializer, 504: None},
+        description="Dry-run a candidate rule set and list per-document differences with the stored result_data",
+        tags=["PDF Extraction"]
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = RuleDryRunSerializer(data=request.data)
+
+        if not serializer.is_valid():
             return Response(
-                {"error": f"Error processing PDF: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        finally:
-            # Clean up temporary file
-            if temp_file and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                    logger.debug(f"Cleaned up temporary file: {temp_file_path}")
-                except Exception as e:
-                    logger.error(f"Error cleaning up temporary file: {str(e)}")
+        customer_name = serializer.validated_data['customer_name']
+        rules = serializer.validated_data.get('rules')
+        if rules is None:
+            rules = rules_as_dicts(customer_name)
+
+        try:
+            result = dry_run_rules(customer_name, rules, sample_size=serializer.validated_data['sample_size'])
+        except DryRunTimeout as e:
+            logger.warning(f"Dry run for {customer_name} aborted: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+        logger.info(f"Dry run for {customer_name}: {result['changed']} of {result['documents']} documents changed")
+        return Response(result)
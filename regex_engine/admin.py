@@ -1,18 +1,26 @@
 from django.contrib import admin
 from django.contrib import messages
+from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
+from django.shortcuts import render
 from django.urls import reverse
 from unfold.admin import ModelAdmin
+from unfold.decorators import action
+from .forms import RuleDryRunForm
+from .models import CustomerExtractionPolicy
 from .models import CustomerRegexRule
+from .stats import get_pattern_stats
 
 
 @admin.register(CustomerRegexRule)
 class CustomerRegexRuleAdmin(ModelAdmin):
-    list_display = ('customer_name', 'customer_id', 'field_name', 'regex_pattern', 'regex_group', 'is_item_field')
+    list_display = ('customer_name', 'customer_id', 'field_name', 'regex_pattern', 'regex_group', 'is_item_field', 'timeout_count')
     list_filter = ('customer_name', 'field_name')
     search_fields = ('customer_name', 'customer_id', 'field_name')
     actions = ['duplicate_rows']
+    actions_detail = ['dry_run']
     warn_unsaved_form = True
+    readonly_fields = ('timeout_count', 'last_timeout_at', 'pattern_stats')
 
     fieldsets = (
         ('Customer Information', {
@@ -20,15 +28,76 @@ class CustomerRegexRuleAdmin(ModelAdmin):
             'classes': ('tab',)
         }),
         ('Regex Configuration', {
-            'fields': ('field_name', 'is_item_field', 'regex_pattern', 'regex_group'),
+            'fields': ('field_name', 'is_item_field', 'is_row_anchor', 'is_untrusted', 'regex_pattern', 'regex_group'),
             'classes': ('tab',)
         }),
         ('Regex Additional Patterns', {
             'fields': ('regex_pattern_v2', 'regex_pattern_v3'),
             'classes': ('tab',)
         }),
+        ('Diagnostics', {
+            'fields': ('timeout_count', 'last_timeout_at', 'pattern_stats'),
+            'classes': ('tab',)
+        }),
     )
 
+    def pattern_stats(self, obj):
+        """
+        Hits, attempts and average latency of each pattern, as used to order the fallbacks
+        """
+        if obj is None or obj.pk is None:
+            return '-'
+        pattern_names = ('regex_pattern', 'regex_pattern_v2', 'regex_pattern_v3')
+        stats = get_pattern_stats().load([obj.pk], pattern_names)
+        lines = []
+        for pattern_name in pattern_names:
+            counters = stats.get((obj.pk, pattern_name))
+            if not counters or not counters['attempts']:
+                continue
+            average_ms = counters['micros'] / counters['attempts'] / 1000
+            lines.append(f"{pattern_name}: {counters['hits']}/{counters['attempts']} hits, {average_ms:.2f} ms avg")
+        return '\n'.join(lines) or 'No attempts recorded'
+
+    pattern_stats.short_description = "Pattern statistics"
+
+    @action(description="Dry run", url_path='dry-run')
+    def dry_run(self, request, object_id):
+        """
+        Try edited patterns of this rule against the customer's latest stored documents
+        """
+        from pdf_extraction.dry_run import DryRunTimeout, dry_run_rules, rules_as_dicts
+
+        rule = get_object_or_404(CustomerRegexRule, pk=object_id)
+        form = RuleDryRunForm(request.POST or None, initial={
+            'regex_pattern': rule.regex_pattern,
+            'regex_pattern_v2': rule.regex_pattern_v2,
+            'regex_pattern_v3': rule.regex_pattern_v3,
+            'regex_group': rule.regex_group,
+        })
+        result = None
+
+        if request.method == 'POST' and form.is_valid():
+            candidate = dict(form.cleaned_data)
+            sample_size = candidate.pop('sample_size')
+            # The customer's stored rule set, with this rule replaced by the edited patterns
+            rules = rules_as_dicts(rule.customer_name)
+            for stored in rules:
+                if stored['id'] == rule.id:
+                    stored.update(candidate)
+            try:
+                result = dry_run_rules(rule.customer_name, rules, sample_size=sample_size)
+            except DryRunTimeout as e:
+                form.add_error(None, str(e))
+
+        return render(request, 'regex_engine/dry_run.html', {
+            **self.admin_site.each_context(request),
+            'title': f'Dry run: {rule}',
+            'opts': self.model._meta,
+            'rule': rule,
+            'form': form,
+            'result': result,
+        })
+
     def duplicate_rows(self, request, queryset):
         """
         Action for duplicating selected rows
@@ -64,3 +133,9 @@ class CustomerRegexRuleAdmin(ModelAdmin):
         )
 
     duplicate_rows.short_description = "Duplicate selected rows"
+
+
+@admin.register(CustomerExtractionPolicy)
+class CustomerExtractionPolicyAdmin(ModelAdmin):
+    list_display = ('customer_name', 'max_pages', 'stop_when_header_complete')
+    warn_unsaved_form = True
@@ -5,3 +5,7 @@ class RegexEngineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'regex_engine'
     verbose_name = 'Regex Engine'
+
+    def ready(self):
+        # Import signals to ensure they are registered
+        import regex_engine.signals  # noqa
@@ -0,0 +1,243 @@
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .guard import TIMED_OUT, RuleTimeout, time_budget
+from .rules import CompiledRule
+
+logger = logging.getLogger(__name__)
+
+# Characters with a special meaning outside of a character class
+_METACHARACTERS = set('.^$*+?{}[]\\|()')
+_QUANTIFIERS = set('*+?{')
+# Zero-width assertions that may precede the literal prefix without moving the match start
+_LEADING_ASSERTIONS = ('^', '\\A', '\\b')
+
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    depth = 0
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+        index += 1
+    return False
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Return the literal text every match of ``pattern`` must start with, or '' when unknown.
+
+    This is deliberately conservative: patterns with inline flags or a top-level
+    alternation have no prefix, and a literal character followed by a quantifier
+    ends the prefix before it.
+    """
+    if pattern.startswith('(?') or _has_top_level_alternation(pattern):
+        return ''
+
+    index = 0
+    stripped = True
+    while stripped:
+        stripped = False
+        for assertion in _LEADING_ASSERTIONS:
+            if pattern.startswith(assertion, index):
+                index += len(assertion)
+                stripped = True
+
+    literal = []
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            escaped = pattern[index + 1:index + 2]
+            if not escaped or escaped.isalnum():
+                break
+            char = escaped
+            step = 2
+        elif char in _METACHARACTERS:
+            break
+        else:
+            step = 1
+
+        if pattern[index + step:index + step + 1] in _QUANTIFIERS:
+            break
+        literal.append(char)
+        index += step
+
+    return ''.join(literal)
+
+
+class HeaderRulePlan:
+    """Execution plan of a single header rule"""
+
+    def __init__(self, rule: CompiledRule, position: int):
+        self.rule = rule
+        self.position = position
+        pattern = rule.patterns[0] if rule.patterns else None
+        self.regex: Optional[re.Pattern] = pattern.regex if pattern else None
+        self.literal = literal_prefix(pattern.source) if self.regex is not None else ''
+
+    @property
+    def cost(self):
+        # Literal-anchored rules only try the regex at literal hits, longer literals hit less often
+        if self.literal:
+            return (0, -len(self.literal), self.position)
+        return (1, len(self.regex.pattern) if self.regex is not None else 0, self.position)
+
+    def search(self, text: str) -> Optional[re.Match]:
+        """Equivalent to ``self.regex.search(text)``"""
+        if not self.literal:
+            return self.regex.search(text)
+
+        # Every match starts with the literal, so only the positions where it occurs can match.
+        # pattern.match(text, pos) evaluates anchors and lookbehinds against the whole text,
+        # exactly like the attempt search() would make at that position.
+        position = text.find(self.literal)
+        while position != -1:
+            match = self.regex.match(text, position)
+            if match:
+                return match
+            position = text.find(self.literal, position + 1)
+        return None
+
+
+class HeaderExtractionPlan:
+    """
+    Evaluates all header rules of a rule set against one document.
+
+    Rules with a literal prefix are prefiltered with ``str.find`` and their regex is only
+    tried at literal hits; the remaining rules fall back to a regular search. Rules run
+    cheapest first, and results are identical to one ``re.search`` per rule.
+    """
+
+    def __init__(self, header_rules: List[CompiledRule]):
+        self.rules = [HeaderRulePlan(rule, position) for position, rule in enumerate(header_rules)]
+        self.ordered_rules = sorted((plan for plan in self.rules if plan.regex is not None), key=lambda plan: plan.cost)
+        literal_count = sum(1 for plan in self.rules if plan.literal)
+        logger.debug(f"Header plan: {literal_count} of {len(self.rules)} rules anchored on a literal prefix")
+
+    def search(self, text: str) -> Dict[int, Optional[re.Match]]:
+        """
+        Return the first match of every valid rule, keyed by rule id.
+
+        Each rule runs under its own time budget; a rule exceeding it maps to TIMED_OUT
+        while the remaining rules are still evaluated.
+        """
+        matches = {}
+        for plan in self.ordered_rules:
+            try:
+                with time_budget():
+                    matches[plan.rule.id] = plan.search(text)
+            except RuleTimeout:
+                logger.error(f"Header field '{plan.rule.field_name}' exceeded its time budget, rule {plan.rule.id} aborted")
+                matches[plan.rule.id] = TIMED_OUT
+            except Exception as e:
+                logger.error(f"Unexpected error searching header field '{plan.rule.field_name}': {str(e)}")
+                matches[plan.rule.id] = None
+        return matches
+
+    def completion_tracker(self) -> Callable[[str], bool]:
+        """
+        Return a function that is fed the pages of a document in order and tells whether
+        every valid rule has matched one of the pages fed so far.
+
+        Each page is only searched by the rules still missing. A match spanning two pages
+        or a rule exceeding its time budget is not counted, which can only mean reading on.
+        """
+        remaining = list(self.ordered_rules)
+
+        def feed(page_text: str) -> bool:
+            for plan in list(remaining):
+                try:
+                    with time_budget():
+                        matched = plan.search(page_text) is not None
+                except Exception:
+                    matched = False
+                if matched:
+                    remaining.remove(plan)
+            return not remaining
+
+        return feed
+
+
+def group_value(match, group_num: Optional[int]) -> Optional[str]:
+    """Stripped value of a 1-based group of an item match, None when missing or empty"""
+    groups = match.groups()
+    if group_num is None or len(groups) < group_num:
+        return None
+    value = groups[group_num - 1]
+    return value.strip() if value else None
+
+
+class RowSegmentedItemPlan:
+    """
+    Extracts line items by first segmenting the text into rows, then matching fields per row.
+
+    One pass of the anchor rule finds where every row starts; a row ends where the next
+    one begins. Every other item rule is searched only inside each row, so a field that
+    is missing in one row leaves that row's value empty instead of shifting later rows.
+    """
+
+    def __init__(self, anchor: CompiledRule, item_rules: List[CompiledRule]):
+        self.anchor = anchor
+        self.field_rules = [rule for rule in item_rules if rule is not anchor]
+
+    def segment(self, text: str, timed_out: Optional[List[Dict[str, Any]]] = None) -> List[Tuple[re.Match, int, int]]:
+        """Return ``(anchor_match, start, end)`` for every row, using the first anchor pattern that matches"""
+        for pattern in self.anchor.patterns:
+            if pattern.regex is None:
+                continue
+            try:
+                with time_budget():
+                    anchors = list(pattern.regex.finditer(text))
+            except RuleTimeout:
+                logger.error(f"Row anchor '{self.anchor.field_name}' ({pattern.name}) exceeded its time budget")
+                if timed_out is not None:
+                    timed_out.append({'rule_id': self.anchor.id, 'field_name': self.anchor.field_name, 'pattern': pattern.name})
+                continue
+            if anchors:
+                logger.info(f"Row anchor '{self.anchor.field_name}' matched using {pattern.name} with {len(anchors)} rows")
+                ends = [match.start() for match in anchors[1:]] + [len(text)]
+                return [(match, match.start(), end) for match, end in zip(anchors, ends)]
+        return []
+
+    def extract(self, text: str, timed_out: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        rows = self.segment(text, timed_out)
+        items = [{self.anchor.field_name: group_value(match, self.anchor.regex_group)} for match, _, _ in rows]
+
+        for rule in self.field_rules:
+            patterns = [pattern for pattern in rule.patterns if pattern.regex is not None]
+            try:
+                with time_budget():
+                    for item, (_, start, end) in zip(items, rows):
+                        item[rule.field_name] = self._search_row(rule, patterns, text, start, end)
+            except RuleTimeout:
+                logger.error(f"Item field '{rule.field_name}' exceeded its time budget, rule {rule.id} aborted")
+                if timed_out is not None:
+                    timed_out.append({'rule_id': rule.id, 'field_name': rule.field_name, 'pattern': 'row'})
+                for item in items:
+                    item.setdefault(rule.field_name, None)
+
+        return items
+
+    @staticmethod
+    def _search_row(rule: CompiledRule, patterns, text: str, start: int, end: int) -> Optional[str]:
+        # Fallback patterns are tried in order within the row only
+        for pattern in patterns:
+            match = pattern.regex.search(text, start, end)
+            if match:
+                return group_value(match, rule.regex_group)
+        return None
@@ -0,0 +1,19 @@
+from django import forms
+from django.conf import settings
+from unfold.widgets import UnfoldAdminIntegerFieldWidget
+from unfold.widgets import UnfoldAdminTextareaWidget
+
+
+class RuleDryRunForm(forms.Form):
+    """Candidate patterns of one rule, tried against the customer's latest stored documents"""
+    regex_pattern = forms.CharField(widget=UnfoldAdminTextareaWidget(attrs={'rows': 3}))
+    regex_pattern_v2 = forms.CharField(required=False, widget=UnfoldAdminTextareaWidget(attrs={'rows': 3}))
+    regex_pattern_v3 = forms.CharField(required=False, widget=UnfoldAdminTextareaWidget(attrs={'rows': 3}))
+    regex_group = forms.IntegerField(min_value=1, initial=1, widget=UnfoldAdminIntegerFieldWidget)
+    sample_size = forms.IntegerField(min_value=1, initial=100, widget=UnfoldAdminIntegerFieldWidget)
+
+    def clean_sample_size(self):
+        value = self.cleaned_data['sample_size']
+        if value > settings.REGEX_DRY_RUN_MAX_SAMPLE:
+            raise forms.ValidationError(f"Sample size must not exceed {settings.REGEX_DRY_RUN_MAX_SAMPLE}")
+        return value
@@ -0,0 +1,59 @@
+import logging
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RuleTimeout(Exception):
+    """Raised inside a regex evaluation that exceeded its time budget"""
+
+
+# Marks a rule whose evaluation was aborted, in place of its match
+TIMED_OUT = object()
+
+
+def can_enforce_budget() -> bool:
+    """Budgets rely on SIGALRM, which is only delivered to the main thread"""
+    return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+
+def _raise_timeout(signum, frame):
+    raise RuleTimeout()
+
+
+@contextmanager
+def time_budget(seconds: Optional[float] = None) -> Iterator[None]:
+    """
+    Abort the enclosed regex evaluation with RuleTimeout once ``seconds`` have elapsed.
+
+    ``re`` checks for pending signals while matching, so a SIGALRM timer can interrupt a
+    catastrophically backtracking pattern. Outside the main thread budgets cannot be
+    enforced and the block runs unguarded.
+    """
+    if seconds is None:
+        seconds = settings.REGEX_RULE_TIME_BUDGET
+    if not seconds or not can_enforce_budget():
+        yield
+        return
+
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def get_linear_backend():
+    """Return the RE2 module used for untrusted rules, or None when google-re2 is not installed"""
+    try:
+        import re2
+    except ImportError:
+        return None
+    return re2
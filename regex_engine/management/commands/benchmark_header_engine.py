@@ -0,0 +1,98 @@
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from regex_engine.engine import HeaderExtractionPlan
+from regex_engine.guard import TIMED_OUT
+from regex_engine.models import CustomerRegexRule
+from regex_engine.rules import RULE_FLAGS
+from regex_engine.rules import CompiledRuleSet
+
+
+class Command(BaseCommand):
+    help = "Compare the header extraction plan against one re.search per rule on a large text corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer', help="Benchmark the header rules of this customer instead of synthetic rules")
+        parser.add_argument('--text-file', help="Use this text file as corpus instead of a generated one")
+        parser.add_argument('--fields', type=int, default=40, help="Number of synthetic header rules")
+        parser.add_argument('--pages', type=int, default=300, help="Number of pages in the generated corpus")
+        parser.add_argument('--repeat', type=int, default=5, help="Timing runs per implementation")
+
+    def handle(self, *args, **options):
+        if options['customer']:
+            rules = list(CustomerRegexRule.objects.filter(customer_name=options['customer']).order_by('id'))
+            if not rules:
+                raise CommandError(f"No regex rules found for customer: {options['customer']}")
+        else:
+            rules = self.synthetic_rules(options['fields'])
+
+        if options['text_file']:
+            with open(options['text_file'], encoding='utf-8') as f:
+                text = f.read()
+        else:
+            text = self.synthetic_corpus(options['fields'], options['pages'])
+
+        header_rules = CompiledRuleSet(options['customer'] or 'benchmark', rules).header_rules
+        plan = HeaderExtractionPlan(header_rules)
+        patterns = [(rule.id, rule.patterns[0].source) for rule in header_rules if rule.patterns[0].regex]
+
+        def legacy():
+            return {rule_id: re.search(pattern, text, RULE_FLAGS) for rule_id, pattern in patterns}
+
+        legacy_matches = legacy()
+        plan_matches = plan.search(text)
+        for rule_id, match in legacy_matches.items():
+            if plan_matches[rule_id] is TIMED_OUT:
+                raise CommandError(f"Rule {rule_id} exceeded its time budget in the extraction plan")
+            expected = match.span() if match else None
+            actual = plan_matches[rule_id].span() if plan_matches[rule_id] else None
+            if expected != actual:
+                raise CommandError(f"Rule {rule_id} differs: re.search {expected}, plan {actual}")
+
+        legacy_seconds = self.best_of(legacy, options['repeat'])
+        plan_seconds = self.best_of(lambda: plan.search(text), options['repeat'])
+        literal_rules = sum(1 for rule_plan in plan.rules if rule_plan.literal)
+
+        self.stdout.write(f"Corpus: {len(text)} characters, {len(header_rules)} header rules ({literal_rules} literal-anchored)")
+        self.stdout.write(f"re.search per rule: {legacy_seconds * 1000:.2f} ms")
+        self.stdout.write(f"Extraction plan:    {plan_seconds * 1000:.2f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"Identical results, speedup x{legacy_seconds / plan_seconds:.1f}" if plan_seconds else "Identical results"
+        ))
+
+    @staticmethod
+    def best_of(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    @staticmethod
+    def synthetic_rules(fields):
+        rules = []
+        for index in range(fields):
+            pattern = rf'Field {index:03d} Label:\s*(.*?)\n' if index % 4 else rf'(?:Ref|Reference) {index:03d}:\s*(\S+)'
+            rules.append(CustomerRegexRule(id=index + 1, customer_name='benchmark', field_name=f'field_{index}',
+                                           regex_pattern=pattern, regex_group=1))
+        return rules
+
+    @staticmethod
+    def synthetic_corpus(fields, pages):
+        generator = random.Random(42)
+        words = ['invoice', 'total', 'amount', 'qty', 'price', 'supplier', 'delivery', 'item', 'tax', 'code']
+        lines = []
+        for page in range(pages):
+            for _ in range(60):
+                lines.append(' '.join(generator.choice(words) for _ in range(10)))
+            if page == pages - 1:
+                # Header values sit at the end, so each legacy search walks the whole corpus
+                for index in range(fields):
+                    lines.append(f'Field {index:03d} Label: value-{index}')
+                    lines.append(f'Reference {index:03d}: REF{index}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regex_engine', '0004_customerregexrule_regex_pattern_v2_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerregexrule',
+            name='is_untrusted',
+            field=models.BooleanField(default=False, help_text='Evaluate the patterns with the linear-time RE2 engine when it is installed'),
+        ),
+        migrations.AddField(
+            model_name='customerregexrule',
+            name='last_timeout_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerregexrule',
+            name='timeout_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
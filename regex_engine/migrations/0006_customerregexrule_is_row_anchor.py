@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regex_engine', '0005_customerregexrule_is_untrusted_and_timeouts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerregexrule',
+            name='is_row_anchor',
+            field=models.BooleanField(default=False, help_text='Item field whose matches mark the start of each line item row'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regex_engine', '0006_customerregexrule_is_row_anchor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerExtractionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(choices=[('Food Hall', 'Food Hall')], max_length=255, unique=True)),
+                ('max_pages', models.PositiveIntegerField(blank=True, help_text='Parse at most this many pages of each document, counted from the first', null=True)),
+                ('stop_when_header_complete', models.BooleanField(default=False, help_text='Stop parsing a document once every header rule has matched; item rules then only see the pages read up to that point')),
+            ],
+            options={
+                'verbose_name': 'Customer Extraction Policy',
+                'verbose_name_plural': 'Customer Extraction Policies',
+            },
+        ),
+    ]
@@ -10,6 +10,39 @@ class CustomerRegexRule(models.Model):
     regex_pattern_v3 = models.TextField(null=True, blank=True)
     regex_group = models.IntegerField(null=True, blank=True, default=1)
     is_item_field = models.BooleanField(default=False)
+    is_row_anchor = models.BooleanField(
+        default=False,
+        help_text="Item field whose matches mark the start of each line item row",
+    )
+    is_untrusted = models.BooleanField(
+        default=False,
+        help_text="Evaluate the patterns with the linear-time RE2 engine when it is installed",
+    )
+    timeout_count = models.IntegerField(default=0)
+    last_timeout_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.customer_name} - {self.field_name}"
+
+
+class CustomerExtractionPolicy(models.Model):
+    """How much of each document of a customer is parsed before its rules run"""
+    customer_name = models.CharField(max_length=255, unique=True,
+                                     choices=(('Food Hall', 'Food Hall'),))
+    max_pages = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Parse at most this many pages of each document, counted from the first",
+    )
+    stop_when_header_complete = models.BooleanField(
+        default=False,
+        help_text="Stop parsing a document once every header rule has matched; "
+                  "item rules then only see the pages read up to that point",
+    )
+
+    class Meta:
+        verbose_name = 'Customer Extraction Policy'
+        verbose_name_plural = 'Customer Extraction Policies'
+
+    def __str__(self):
+        return f"{self.customer_name} extraction policy"
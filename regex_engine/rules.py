@@ -0,0 +1,181 @@
+import logging
+import re
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .guard import get_linear_backend
+from .models import CustomerExtractionPolicy, CustomerRegexRule
+
+logger = logging.getLogger(__name__)
+
+RULE_FLAGS = re.MULTILINE | re.DOTALL
+RULES_VERSION_KEY = 'regex_engine:rules_version'
+
+
+class CompiledPattern:
+    """One pattern of a rule, precompiled with the flags used for extraction"""
+
+    def __init__(self, name: str, source: str, linear: bool = False):
+        self.name = name
+        self.source = source
+        self.error: Optional[str] = None
+        self.linear = False
+        self.regex = None
+
+        if linear:
+            self._compile_linear(source)
+        if self.regex is None:
+            try:
+                self.regex = re.compile(source, RULE_FLAGS)
+            except re.error as e:
+                self.error = str(e)
+
+    def _compile_linear(self, source: str) -> None:
+        re2 = get_linear_backend()
+        if re2 is None:
+            logger.warning(f"google-re2 is not installed, running untrusted pattern {self.name} with time-budgeted re")
+            return
+        try:
+            # RE2 takes the MULTILINE and DOTALL extraction flags inline
+            self.regex = re2.compile(f'(?ms){source}')
+            self.linear = True
+        except Exception as e:
+            logger.warning(f"Pattern {self.name} is not supported by RE2 ({str(e)}), using time-budgeted re")
+
+
+class CompiledRule:
+    """A CustomerRegexRule with its patterns compiled once"""
+
+    def __init__(self, rule: CustomerRegexRule):
+        self.id = rule.id
+        self.field_name = rule.field_name
+        self.regex_group = rule.regex_group
+        self.is_item_field = rule.is_item_field
+        self.is_row_anchor = rule.is_item_field and rule.is_row_anchor
+        self.is_untrusted = rule.is_untrusted
+
+        # Header rules only use regex_pattern, item rules fall back to v2 and v3 in order
+        sources = [('regex_pattern', rule.regex_pattern)]
+        if rule.is_item_field:
+            sources += [('regex_pattern_v2', rule.regex_pattern_v2), ('regex_pattern_v3', rule.regex_pattern_v3)]
+        self.patterns = [
+            CompiledPattern(name, source, linear=rule.is_untrusted) for name, source in sources if source
+        ]
+
+
+class CompiledRuleSet:
+    """Precompiled header and item rules of one customer, with its page policy"""
+
+    def __init__(
+        self, customer_name: str, rules: List[CustomerRegexRule], version: Optional[str] = None,
+        policy: Optional[CustomerExtractionPolicy] = None
+    ):
+        self.customer_name = customer_name
+        self.version = version
+        compiled = [CompiledRule(rule) for rule in rules]
+        self.header_rules = [rule for rule in compiled if not rule.is_item_field]
+        self.item_rules = [rule for rule in compiled if rule.is_item_field]
+        self.row_anchor = next((rule for rule in self.item_rules if rule.is_row_anchor), None)
+        self.max_pages = policy.max_pages if policy else None
+        # Without header rules there is nothing to wait for
+        self.stop_when_header_complete = bool(policy and policy.stop_when_header_complete and self.header_rules)
+        self._header_plan = None
+        self._item_plan = None
+
+    @property
+    def page_policy(self) -> str:
+        """
+        Identifies the part of a document this rule set reads, '' for all of it.
+
+        Text read under a policy is stored with it and only reused under the same one.
+        Where parsing stops for a complete header depends on the rules, so that policy
+        includes the rules version.
+        """
+        parts = []
+        if self.max_pages:
+            parts.append(f'max_pages={self.max_pages}')
+        if self.stop_when_header_complete:
+            parts.append(f'header_complete={self.version}')
+        return ','.join(parts)
+
+    @property
+    def header_plan(self):
+        """Execution plan for the header rules, built on first use"""
+        if self._header_plan is None:
+            from .engine import HeaderExtractionPlan
+
+            self._header_plan = HeaderExtractionPlan(self.header_rules)
+        return self._header_plan
+
+    @property
+    def item_plan(self):
+        """Row-segmented item extraction plan, or None when no item rule is a row anchor"""
+        if self._item_plan is None and self.row_anchor is not None:
+            from .engine import RowSegmentedItemPlan
+
+            self._item_plan = RowSegmentedItemPlan(self.row_anchor, self.item_rules)
+        return self._item_plan
+
+    @classmethod
+    def load(cls, customer_name: str, version: Optional[str] = None) -> 'CompiledRuleSet':
+        """Build the rule set of a customer with one query for its rules and one for its policy"""
+        rules = list(CustomerRegexRule.objects.filter(customer_name=customer_name).order_by('id'))
+        policy = CustomerExtractionPolicy.objects.filter(customer_name=customer_name).first()
+        logger.info(f"Compiled {len(rules)} regex rules for customer: {customer_name}")
+        return cls(customer_name, rules, version=version, policy=policy)
+
+
+_rule_sets: Dict[str, CompiledRuleSet] = {}
+_rule_sets_lock = threading.Lock()
+
+
+def get_rules_version() -> str:
+    """Return the shared rules version, initialising it when the cache holds none"""
+    version = cache.get(RULES_VERSION_KEY)
+    if version is None:
+        cache.add(RULES_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(RULES_VERSION_KEY)
+    return version
+
+
+def bump_rules_version() -> None:
+    """Invalidate compiled rule sets in this process and, through the shared version key, in all others"""
+    cache.set(RULES_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    clear_rule_set_cache()
+
+
+def clear_rule_set_cache() -> None:
+    with _rule_sets_lock:
+        _rule_sets.clear()
+
+
+def get_rule_set(customer_name: str) -> CompiledRuleSet:
+    """
+    Return the compiled rule set of a customer from the process-level cache.
+
+    The cached set is reused as long as the shared rules version is unchanged, so
+    extracting a document costs no database queries for its rules.
+    """
+    version = get_rules_version()
+    rule_set = _rule_sets.get(customer_name)
+    if rule_set is not None and rule_set.version == version:
+        return rule_set
+
+    rule_set = CompiledRuleSet.load(customer_name, version=version)
+    with _rule_sets_lock:
+        _rule_sets[customer_name] = rule_set
+    return rule_set
+
+
+def record_rule_timeouts(timed_out: List[Dict[str, str]]) -> None:
+    """Count budget overruns on the offending rules, without invalidating compiled rule sets"""
+    for rule_id in {entry['rule_id'] for entry in timed_out}:
+        CustomerRegexRule.objects.filter(id=rule_id).update(
+            timeout_count=F('timeout_count') + 1,
+            last_timeout_at=timezone.now(),
+        )
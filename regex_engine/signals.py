@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomerExtractionPolicy, CustomerRegexRule
+from .rules import bump_rules_version
+
+
+@receiver(post_save, sender=CustomerRegexRule)
+@receiver(post_delete, sender=CustomerRegexRule)
+def handle_customer_regex_rule_change(sender, instance: CustomerRegexRule, **kwargs):
+    # Compiled rule sets are cached per process, make every worker rebuild them. Only once
+    # the change is committed, or a worker could cache the old rows under the new version.
+    transaction.on_commit(bump_rules_version)
+
+
+@receiver(post_save, sender=CustomerExtractionPolicy)
+@receiver(post_delete, sender=CustomerExtractionPolicy)
+def handle_customer_extraction_policy_change(sender, instance: CustomerExtractionPolicy, **kwargs):
+    # The page policy is part of the compiled rule sets
+    transaction.on_commit(bump_rules_version)
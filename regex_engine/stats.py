@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .rules import CompiledPattern, CompiledRule
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('attempts', 'hits', 'micros')
+
+
+def stats_key(rule_id: int, pattern_name: str, counter: str) -> str:
+    return f'regex_engine:pattern_stats:{rule_id}:{pattern_name}:{counter}'
+
+
+class PatternStats:
+    """
+    Per-rule, per-pattern attempt, hit and latency counters shared through the Django cache.
+
+    Counters are accumulated in-process and flushed in batches with atomic increments.
+    The ordering of fallback patterns uses a snapshot of the shared counters, refreshed
+    at most every ``refresh_interval`` seconds, plus this process's unflushed counters.
+    """
+
+    def __init__(self, refresh_interval: float, flush_threshold: int):
+        self.refresh_interval = refresh_interval
+        self.flush_threshold = flush_threshold
+        self._pending: Dict[Tuple[int, str], List[int]] = {}
+        self._pending_records = 0
+        self._snapshot: Dict[Tuple[int, str], List[int]] = {}
+        self._snapshot_loaded_at: Dict[int, float] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, rule_id: int, pattern_name: str, hit: bool, seconds: float) -> None:
+        with self._lock:
+            counters = self._pending.setdefault((rule_id, pattern_name), [0, 0, 0])
+            counters[0] += 1
+            counters[1] += int(hit)
+            counters[2] += int(seconds * 1_000_000)
+            self._pending_records += 1
+            due = (
+                self._pending_records >= self.flush_threshold
+                or time.monotonic() - self._last_flush >= self.refresh_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Add the pending counters to the shared counters"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_records = 0
+            self._last_flush = time.monotonic()
+
+        for (rule_id, pattern_name), values in pending.items():
+            for counter, delta in zip(COUNTERS, values):
+                if delta:
+                    self._increment(stats_key(rule_id, pattern_name, counter), delta)
+
+    def order(self, rule: CompiledRule) -> List[CompiledPattern]:
+        """Patterns of a rule, most likely to match first, ties kept in their original order"""
+        if len(rule.patterns) < 2:
+            return rule.patterns
+        self._refresh(rule)
+
+        def likelihood(pattern: CompiledPattern) -> float:
+            key = (rule.id, pattern.name)
+            shared = self._snapshot.get(key, (0, 0, 0))
+            pending = self._pending.get(key, (0, 0, 0))
+            attempts, hits = shared[0] + pending[0], shared[1] + pending[1]
+            # Laplace smoothing: untried patterns rank in the middle, by their original position
+            return (hits + 1) / (attempts + 2)
+
+        return sorted(rule.patterns, key=lambda pattern: -likelihood(pattern))
+
+    def load(self, rule_ids: Iterable[int], pattern_names: Iterable[str]) -> Dict[Tuple[int, str], Dict[str, int]]:
+        """Read the shared counters of the given rules and patterns"""
+        keys = {
+            stats_key(rule_id, pattern_name, counter): (rule_id, pattern_name, counter)
+            for rule_id in rule_ids for pattern_name in pattern_names for counter in COUNTERS
+        }
+        stats: Dict[Tuple[int, str], Dict[str, int]] = {}
+        for key, value in cache.get_many(list(keys)).items():
+            rule_id, pattern_name, counter = keys[key]
+            stats.setdefault((rule_id, pattern_name), dict.fromkeys(COUNTERS, 0))[counter] = value
+        return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._pending_records = 0
+            self._snapshot.clear()
+            self._snapshot_loaded_at.clear()
+
+    def _refresh(self, rule: CompiledRule) -> None:
+        loaded_at = self._snapshot_loaded_at.get(rule.id)
+        if loaded_at is not None and time.monotonic() - loaded_at < self.refresh_interval:
+            return
+
+        shared = self.load([rule.id], [pattern.name for pattern in rule.patterns])
+        with self._lock:
+            for pattern in rule.patterns:
+                counters = shared.get((rule.id, pattern.name), dict.fromkeys(COUNTERS, 0))
+                self._snapshot[(rule.id, pattern.name)] = [counters[counter] for counter in COUNTERS]
+            self._snapshot_loaded_at[rule.id] = time.monotonic()
+
+    @staticmethod
+    def _increment(key: str, delta: int) -> None:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            if not cache.add(key, delta, timeout=None):
+                cache.incr(key, delta)
+
+
+_pattern_stats = None
+_pattern_stats_lock = threading.Lock()
+
+
+def get_pattern_stats() -> PatternStats:
+    """Return the process-wide pattern statistics"""
+    global _pattern_stats
+    if _pattern_stats is None:
+        with _pattern_stats_lock:
+            if _pattern_stats is None:
+                _pattern_stats = PatternStats(
+                    refresh_interval=settings.REGEX_PATTERN_STATS_REFRESH,
+                    flush_threshold=settings.REGEX_PATTERN_STATS_FLUSH_THRESHOLD,
+                )
+    return _pattern_stats
@@ -1,3 +1,199 @@
+import re
+
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from .engine import HeaderExtractionPlan
+from .engine import literal_prefix
+from .models import CustomerExtractionPolicy
+from .models import CustomerRegexRule
+from .rules import CompiledRuleSet
+from .rules import clear_rule_set_cache
+from .rules import get_rule_set
+from .rules import get_rules_version
+from .stats import PatternStats
+from .stats import stats_key
+
+
+class CompiledRuleSetTests(TestCase):
+    def setUp(self):
+        clear_rule_set_cache()
+        self.header_rule = CustomerRegexRule.objects.create(
+            customer_name='Food Hall',
+            field_name='invoice_no',
+            regex_pattern=r'Invoice No:\s*(\S+)',
+        )
+        self.item_rule = CustomerRegexRule.objects.create(
+            customer_name='Food Hall',
+            field_name='sku',
+            regex_pattern=r'SKU (\d+)',
+            regex_pattern_v2=r'Code (\d+)',
+            is_item_field=True,
+        )
+
+    def test_rule_set_is_compiled_once_and_reused(self):
+        rule_set = get_rule_set('Food Hall')
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_rule_set('Food Hall'), rule_set)
+
+        self.assertEqual([rule.field_name for rule in rule_set.header_rules], ['invoice_no'])
+        self.assertEqual(
+            [pattern.name for pattern in rule_set.item_rules[0].patterns],
+            ['regex_pattern', 'regex_pattern_v2'],
+        )
+        self.assertEqual(rule_set.header_rules[0].patterns[0].regex.search('Invoice No: A-1').group(1), 'A-1')
+
+    def test_rule_changes_invalidate_the_cached_rule_set(self):
+        rule_set = get_rule_set('Food Hall')
+
+        self.header_rule.regex_pattern = r'Invoice:\s*(\S+)'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.header_rule.save()
+        updated = get_rule_set('Food Hall')
+        self.assertIsNot(updated, rule_set)
+        self.assertEqual(updated.header_rules[0].patterns[0].source, r'Invoice:\s*(\S+)')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item_rule.delete()
+        self.assertEqual(get_rule_set('Food Hall').item_rules, [])
+
+    def test_rules_version_only_changes_once_the_rule_change_commits(self):
+        rule_set = get_rule_set('Food Hall')
+        version = get_rules_version()
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.header_rule.regex_pattern = r'Invoice:\s*(\S+)'
+            self.header_rule.save()
+            self.assertEqual(get_rules_version(), version)
+            self.assertIs(get_rule_set('Food Hall'), rule_set)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_rules_version(), version)
+        self.assertEqual(get_rule_set('Food Hall').header_rules[0].patterns[0].source, r'Invoice:\s*(\S+)')
+
+    def test_extraction_policy_is_part_of_the_rule_set(self):
+        self.assertEqual(get_rule_set('Food Hall').page_policy, '')
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            policy = CustomerExtractionPolicy.objects.create(
+                customer_name='Food Hall', max_pages=2, stop_when_header_complete=True
+            )
+            self.assertIsNone(get_rule_set('Food Hall').max_pages)
+        for callback in callbacks:
+            callback()
+        rule_set = get_rule_set('Food Hall')
+        self.assertEqual(rule_set.max_pages, 2)
+        self.assertEqual(rule_set.page_policy, f'max_pages=2,header_complete={rule_set.version}')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            policy.delete()
+        self.assertEqual(get_rule_set('Food Hall').page_policy, '')
+
+    def test_header_completion_is_tracked_across_pages(self):
+        CustomerRegexRule.objects.create(customer_name='Food Hall', field_name='total', regex_pattern=r'Total:\s*(\S+)')
+        is_complete = get_rule_set('Food Hall').header_plan.completion_tracker()
+
+        self.assertFalse(is_complete('Invoice No: INV-1'))
+        self.assertFalse(is_complete('Line items'))
+        self.assertTrue(is_complete('Total: 10.00'))
+
+    def test_invalid_patterns_are_kept_with_their_error(self):
+        CustomerRegexRule.objects.create(customer_name='Food Hall', field_name='broken', regex_pattern='(unclosed')
+
+        broken = get_rule_set('Food Hall').header_rules[-1]
+        self.assertIsNone(broken.patterns[0].regex)
+        self.assertIn('missing )', broken.patterns[0].error)
+
+
+class HeaderExtractionPlanTests(TestCase):
+    TEXT = (
+        "Invoice No: INV-1\n"
+        "Date: 2025-01-02\n"
+        "Invoice Number INV-2\n"
+        "Total: 10.00\n"
+        "Grand Total: 12.00\n"
+    )
+
+    def test_literal_prefix(self):
+        self.assertEqual(literal_prefix(r'Invoice No:\s*(\S+)'), 'Invoice No:')
+        self.assertEqual(literal_prefix(r'^Total\:(\d+)'), 'Total:')
+        self.assertEqual(literal_prefix(r'Totals? (\d+)'), 'Total')
+        self.assertEqual(literal_prefix(r'Total|Amount'), '')
+        self.assertEqual(literal_prefix(r'(?i)total'), '')
+        self.assertEqual(literal_prefix(r'\d+ items'), '')
+
+    def test_plan_matches_re_search_for_every_rule(self):
+        patterns = [
+            r'Invoice No:\s*(\S+)',
+            r'Invoice Number (\S+)',
+            r'^Total: (\S+)',
+            r'(?<=Grand )Total: (\S+)',
+            r'Total: (\S+)',
+            r'(?:Date|Due): (\S+)',
+            r'Missing: (\S+)',
+            r'Invoice.*?(INV-\d)',
+        ]
+        rules = [
+            CustomerRegexRule(id=index, customer_name='Food Hall', field_name=f'field_{index}', regex_pattern=pattern)
+            for index, pattern in enumerate(patterns, start=1)
+        ]
+        plan = HeaderExtractionPlan(CompiledRuleSet('Food Hall', rules).header_rules)
+
+        matches = plan.search(self.TEXT)
+        for rule in rules:
+            expected = re.search(rule.regex_pattern, self.TEXT, re.MULTILINE | re.DOTALL)
+            actual = matches[rule.id]
+            self.assertEqual(actual.span() if actual else None, expected.span() if expected else None, rule.regex_pattern)
+
+        self.assertEqual(plan.ordered_rules[0].literal, 'Invoice Number ')
+
+
+class PatternStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rule = CompiledRuleSet('Food Hall', [CustomerRegexRule(
+            id=1,
+            customer_name='Food Hall',
+            field_name='sku',
+            regex_pattern=r'SKU (\d+)',
+            regex_pattern_v2=r'Code (\d+)',
+            regex_pattern_v3=r'Item (\d+)',
+            is_item_field=True,
+        )]).item_rules[0]
+
+    def test_untried_patterns_keep_their_order(self):
+        stats = PatternStats(refresh_interval=0, flush_threshold=100)
+        self.assertEqual(
+            [pattern.name for pattern in stats.order(self.rule)],
+            ['regex_pattern', 'regex_pattern_v2', 'regex_pattern_v3'],
+        )
+
+    def test_patterns_that_match_most_often_are_tried_first(self):
+        stats = PatternStats(refresh_interval=0, flush_threshold=100)
+        for _ in range(5):
+            stats.record(1, 'regex_pattern', False, 0.001)
+            stats.record(1, 'regex_pattern_v2', False, 0.001)
+            stats.record(1, 'regex_pattern_v3', True, 0.002)
+
+        self.assertEqual(
+            [pattern.name for pattern in stats.order(self.rule)],
+            ['regex_pattern_v3', 'regex_pattern', 'regex_pattern_v2'],
+        )
+
+    def test_flushed_counters_are_shared_between_processes(self):
+        worker = PatternStats(refresh_interval=60, flush_threshold=2)
+        worker.record(1, 'regex_pattern_v2', True, 0.004)
+        self.assertIsNone(cache.get(stats_key(1, 'regex_pattern_v2', 'attempts')))
+        worker.record(1, 'regex_pattern_v2', True, 0.002)
+
+        self.assertEqual(cache.get(stats_key(1, 'regex_pattern_v2', 'hits')), 2)
+        self.assertEqual(
+            PatternStats(refresh_interval=0, flush_threshold=2).load([1], ['regex_pattern_v2']),
+            {(1, 'regex_pattern_v2'): {'attempts': 2, 'hits': 2, 'micros': 6000}},
+        )
+        self.assertEqual(
+            PatternStats(refresh_interval=0, flush_threshold=2).order(self.rule)[0].name,
+            'regex_pattern_v2',
+        )